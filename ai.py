@@ -1,20 +1,257 @@
 import os
 import json
 import base64
-import mimetypes
-import requests
+import io
 import re
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import image_fetch
 
 try:
     import google.generativeai as genai
 except Exception:
     genai = None
 
+try:
+    from PIL import Image, ImageOps
+except Exception:
+    Image = None
+
+try:
+    from config import GEMINI_API_KEY, GEMINI_MODEL_COPY, GEMINI_MODEL_TRANSLATE, GEMINI_MODEL_NARRATIVE
+    from config import AI_IMAGE_MAX_EDGE, AI_IMAGE_FORMAT, AI_IMAGE_QUALITY
+except ImportError:
+    GEMINI_API_KEY = None
+    GEMINI_MODEL_COPY = GEMINI_MODEL_TRANSLATE = GEMINI_MODEL_NARRATIVE = 'gemini-2.5-pro'
+    AI_IMAGE_MAX_EDGE, AI_IMAGE_FORMAT, AI_IMAGE_QUALITY = 1024, 'JPEG', 85
+
+
+def is_configured(api_key: str = None) -> bool:
+    """
+    True when the Gemini SDK is importable and a real API key is set.
+    """
+    return bool(genai and api_key and api_key != "your_gemini_api_key_here")
+
+
+# Process-wide model registry: configure the SDK once and reuse one model object
+# per (model_name, generation_config) instead of rebuilding them on every call.
+_models: Dict[Tuple[str, str], Any] = {}
+_models_lock = threading.Lock()
+_configured_key: Optional[str] = None
+
+
+def _reset_models() -> None:
+    # A forked worker must not reuse the parent's client connections or lock
+    global _models_lock, _configured_key
+    _models.clear()
+    _models_lock = threading.Lock()
+    _configured_key = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_models)
+
+
+def get_model(model_name: str, generation_config: Dict[str, Any], api_key: str):
+    """
+    Return the shared GenerativeModel for this name/config, configuring the SDK on
+    first use (or when the API key changes). Safe to call from multiple threads.
+    """
+    global _configured_key
+    key = (model_name, json.dumps(generation_config, sort_keys=True))
+    model = _models.get(key)
+    if model is not None and _configured_key == api_key:
+        return model
+    with _models_lock:
+        if _configured_key != api_key:
+            genai.configure(api_key=api_key)
+            _models.clear()
+            _configured_key = api_key
+        model = _models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+            _models[key] = model
+        return model
+
+
+def _stub_suggestions(content_type: str, prompt: str = '', description: str = '') -> List[Dict[str, str]]:
+    """
+    Template suggestions used when Gemini is not configured or returns nothing usable.
+    """
+    base_context = (prompt or description or 'artwork').strip() or 'artwork'
+    titles = [
+        f"{base_context.capitalize()}: A Visual Story",
+        f"{base_context.capitalize()} — Limited Edition",
+        f"The Essence of {base_context.capitalize()}"
+    ]
+    is_product = content_type == 'product'
+    descriptions = [
+        "Handcrafted piece with meticulous detail.",
+        "Original work. Premium materials, gallery-ready finish.",
+        "Expressive composition. Ships safely, ready to display."
+    ] if is_product else [
+        "An exploration through texture, light, and color.",
+        "Captures movement and mood with layered technique.",
+        "A contemplative blend of technique and emotion."
+    ]
+    return [{'title': titles[i], 'description': descriptions[i]} for i in range(3)]
+
+
+def _clean_suggestion(item: Any) -> Optional[Dict[str, str]]:
+    if not isinstance(item, dict):
+        return None
+    title = str(item.get('title', '')).strip()
+    desc = str(item.get('description', '')).strip()
+    if title and desc:
+        return {'title': title, 'description': desc}
+    return None
+
+
+def _suggestions_from_text(text: str) -> List[Dict[str, str]]:
+    """
+    Parse the model's full response text into up to 3 suggestions.
+    """
+    suggestions = []
+    try:
+        # If extra text surrounds JSON, isolate the outermost JSON object
+        candidate = text
+        if '{' in text and '}' in text:
+            candidate = text[text.find('{'): text.rfind('}') + 1]
+        parsed = json.loads(candidate)
+        for item in (parsed.get('suggestions') or [])[:3]:
+            cleaned = _clean_suggestion(item)
+            if cleaned:
+                suggestions.append(cleaned)
+    except Exception:
+        # Fallback: derive multiple variants from lines
+        lines = [ln.strip('- •\t ') for ln in (text or '').split('\n') if ln.strip()]
+        if lines:
+            for i, ln in enumerate(lines[:3]):
+                suggestions.append({
+                    'title': (ln[:60] or 'Artwork Suggestion'),
+                    'description': (ln[:280] or 'A unique piece blending technique and emotion.')
+                })
+    return suggestions
+
+
+def _response_text(result: Any) -> str:
+    """
+    Robustly extract text from a Gemini response or stream chunk.
+    """
+    text = ''
+    try:
+        text = getattr(result, 'text', '') or ''
+    except Exception:
+        text = ''
+    if not text:
+        try:
+            for cand in getattr(result, 'candidates', []) or []:
+                content = getattr(cand, 'content', None)
+                for p in getattr(content, 'parts', []) or []:
+                    pt = getattr(p, 'text', None)
+                    if pt:
+                        text += str(pt)
+        except Exception:
+            text = ''
+    return text
+
+
+def prepare_image(data: bytes, mime_type: str) -> Tuple[bytes, str]:
+    """
+    Downscale artwork to AI_IMAGE_MAX_EDGE on its longest edge, drop EXIF/ICC metadata
+    and re-encode it compactly. Returns the input unchanged if Pillow is missing or
+    the bytes cannot be decoded.
+    """
+    if Image is None or not data:
+        return data, mime_type
+    fmt = 'WEBP' if AI_IMAGE_FORMAT == 'WEBP' else 'JPEG'
+    edge = AI_IMAGE_MAX_EDGE
+    try:
+        img = Image.open(io.BytesIO(data))
+        if (img.format == fmt and max(img.size) <= edge
+                and not img.info.get('exif') and not img.info.get('icc_profile')):
+            # Already compact (e.g. prepared before being queued); skip a second lossy pass
+            return data, Image.MIME[fmt]
+        # Let the JPEG decoder scale down by a power of two while decoding
+        img.draft('RGB', (edge, edge))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel('A'))
+        img.thumbnail((edge, edge), Image.LANCZOS)
+        out = io.BytesIO()
+        # A fresh save without exif=/icc_profile= strips the metadata
+        img.save(out, fmt, quality=AI_IMAGE_QUALITY, optimize=fmt == 'JPEG')
+    except Exception:
+        return data, mime_type
+    return out.getvalue(), 'image/webp' if fmt == 'WEBP' else 'image/jpeg'
+
+
+def _copy_request_parts(content_type: str, prompt: str, description: str, image_url: str,
+                        image_base64: str, image_mime: str, image_bytes: Optional[bytes] = None) -> List[Any]:
+    """
+    Build the Gemini request: the artwork image (if it can be loaded) followed by the instruction.
+    """
+    # Prepare image bytes
+    image_part = None
+    image = None
+    if image_bytes:
+        image = (image_bytes, image_mime or 'image/jpeg')
+    elif image_base64:
+        try:
+            image = (base64.b64decode(image_base64), image_mime or 'image/jpeg')
+        except Exception:
+            image = None
+    elif image_url:
+        # Bounded, pooled fetch; our own uploads are read from disk
+        image = image_fetch.fetch_image(image_url)
+    if image:
+        data, mime_type = prepare_image(*image)
+        image_part = {
+            'mime_type': mime_type,
+            # Request buffers are bytearrays; only ones prepare_image passed through need converting
+            'data': data if isinstance(data, bytes) else bytes(data)
+        }
+
+    user_goal = 'product listing' if content_type == 'product' else 'social post'
+    instruction = (
+        "You are a creative copy assistant for artists. "
+        f"Given an artwork image and optional context for a {user_goal}, "
+        "generate exactly 3 varied suggestions as strict JSON array under key suggestions, "
+        "each item with keys 'title' and 'description'. Keep titles under 60 chars; descriptions under 280 chars. "
+        "Return ONLY JSON with shape: {\"suggestions\":[{\"title\":\"...\",\"description\":\"...\"}, ...]}"
+    )
+
+    # Put image first to ground the response in the artwork
+    parts: List[Any] = []
+    if image_part:
+        parts.append(image_part)
+    parts.append(instruction)
+    if prompt:
+        parts.append(f"Prompt: {prompt}")
+    if description:
+        parts.append(f"Context: {description}")
+    return parts
+
+
+def _copy_model(api_key: str):
+    # Encourage variation and ask for JSON output directly
+    return get_model(
+        GEMINI_MODEL_COPY,
+        {
+            'temperature': 0.9,
+            'top_p': 0.95,
+            'response_mime_type': 'application/json'
+        },
+        api_key
+    )
+
 
 def generate_copy_suggestions(content_type: str, prompt: str = '', description: str = '', 
                             image_url: str = '', image_base64: str = '', image_mime: str = '',
-                            api_key: str = None) -> Dict[str, Any]:
+                            api_key: str = None, image_bytes: Optional[bytes] = None) -> Dict[str, Any]:
     """
     Generate title/description suggestions based on provided prompt/description and optional image.
     Returns a dictionary with 'ok' status and either 'suggestions' or 'error'.
@@ -24,7 +261,7 @@ def generate_copy_suggestions(content_type: str, prompt: str = '', description:
         prompt = prompt.strip()
         description = description.strip()
         image_url = image_url.strip()
-        image_present = bool(image_url or image_base64)
+        image_present = bool(image_url or image_base64 or image_bytes)
 
         # Require image presence for generation to align with UX
         if not image_present:
@@ -34,153 +271,121 @@ def generate_copy_suggestions(content_type: str, prompt: str = '', description:
             }
 
         # If Gemini is configured, use it; otherwise fallback to simple stub
-        if genai and api_key and api_key != "your_gemini_api_key_here":
+        if is_configured(api_key):
             try:
-                genai.configure(api_key=api_key)
-                # Encourage variation and ask for JSON output directly
-                model = genai.GenerativeModel(
-                    model_name='gemini-2.5-pro',
-                    generation_config={
-                        'temperature': 0.9,
-                        'top_p': 0.95,
-                        'response_mime_type': 'application/json'
-                    }
-                )
+                model = _copy_model(api_key)
+                parts = _copy_request_parts(content_type, prompt, description, image_url, image_base64, image_mime,
+                                    image_bytes)
+                result = model.generate_content(parts)
+                suggestions = _suggestions_from_text(_response_text(result).strip())
+                if not suggestions:
+                    # Final fallback simple templates
+                    suggestions = _stub_suggestions(content_type, prompt, description)
+                return {'ok': True, 'suggestions': suggestions}
+            except Exception as e:
+                return {'ok': False, 'error': f'Gemini error: {str(e)}'}
 
-                # Prepare image bytes
-                image_part = None
-                if image_base64:
-                    try:
-                        image_bytes = base64.b64decode(image_base64)
-                        mime_type = image_mime or 'image/jpeg'
-                        image_part = {
-                            'mime_type': mime_type,
-                            'data': image_bytes
-                        }
-                    except Exception:
-                        image_part = None
-                elif image_url:
-                    try:
-                        # Best-effort fetch; limit size
-                        resp = requests.get(image_url, timeout=10)
-                        resp.raise_for_status()
-                        content = resp.content
-                        # Basic size guard (16MB already enforced server-wide)
-                        mime_type = resp.headers.get('Content-Type') or mimetypes.guess_type(image_url)[0] or 'image/jpeg'
-                        image_part = {
-                            'mime_type': mime_type,
-                            'data': content
-                        }
-                    except Exception:
-                        image_part = None
+        # Fallback stub generation when Gemini not configured
+        return {'ok': True, 'suggestions': _stub_suggestions(content_type, prompt, description)}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
 
-                user_goal = 'product listing' if content_type == 'product' else 'social post'
-                guidance = prompt or ''
-                base_text = description or ''
-                instruction = (
-                    "You are a creative copy assistant for artists. "
-                    f"Given an artwork image and optional context for a {user_goal}, "
-                    "generate exactly 3 varied suggestions as strict JSON array under key suggestions, "
-                    "each item with keys 'title' and 'description'. Keep titles under 60 chars; descriptions under 280 chars. "
-                    "Return ONLY JSON with shape: {\"suggestions\":[{\"title\":\"...\",\"description\":\"...\"}, ...]}"
-                )
 
-                # Put image first to ground the response in the artwork
-                parts: List[Any] = []
-                if image_part:
-                    parts.append(image_part)
-                parts.append(instruction)
-                if guidance:
-                    parts.append(f"Prompt: {guidance}")
-                if base_text:
-                    parts.append(f"Context: {base_text}")
+class JsonObjectStream:
+    """
+    Incremental JSON scanner that yields each object nested directly inside an array
+    (e.g. every item of {"suggestions": [...]}) as soon as its closing brace arrives.
+    """
 
-                result = model.generate_content(parts)
+    def __init__(self):
+        self._buf: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._start: Optional[int] = None
+        # Stack depth of the array holding the object being collected
+        self._depth = 0
 
-                # Robustly extract text
-                text = ''
-                try:
-                    text = (getattr(result, 'text', '') or '').strip()
-                except Exception:
-                    text = ''
-                if not text:
+    def feed(self, chunk: str) -> List[Any]:
+        out = []
+        for ch in chunk:
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if ch == '{' and self._start is None and self._stack and self._stack[-1] == '[':
+                    self._start = len(self._buf) - 1
+                    self._depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch in '}]':
+                if self._stack:
+                    self._stack.pop()
+                # Only the object that opened at self._depth ends here; objects nested
+                # inside it (e.g. in a list-valued field) are part of it
+                if ch == '}' and self._start is not None and len(self._stack) == self._depth:
+                    raw = ''.join(self._buf[self._start:])
+                    self._start = None
+                    # Nothing before this point is needed again
+                    self._buf.clear()
                     try:
-                        for cand in getattr(result, 'candidates', []) or []:
-                            content = getattr(cand, 'content', None)
-                            for p in getattr(content, 'parts', []) or []:
-                                pt = getattr(p, 'text', None)
-                                if pt:
-                                    text += str(pt)
-                        text = text.strip()
+                        out.append(json.loads(raw))
                     except Exception:
-                        text = ''
-                suggestions = []
-                try:
-                    # If extra text surrounds JSON, isolate the outermost JSON object
-                    candidate = text
-                    if '{' in text and '}' in text:
-                        candidate = text[text.find('{'): text.rfind('}') + 1]
-                    parsed = json.loads(candidate)
-                    for item in (parsed.get('suggestions') or [])[:3]:
-                        title = str(item.get('title', '')).strip()
-                        desc = str(item.get('description', '')).strip()
-                        if title and desc:
-                            suggestions.append({'title': title, 'description': desc})
-                except Exception:
-                    # Fallback: derive multiple variants from lines
-                    lines = [ln.strip('- •\t ') for ln in (text or '').split('\n') if ln.strip()]
-                    if lines:
-                        for i, ln in enumerate(lines[:3]):
-                            suggestions.append({
-                                'title': (ln[:60] or 'Artwork Suggestion'),
-                                'description': (ln[:280] or 'A unique piece blending technique and emotion.')
-                            })
+                        pass
+        return out
 
-                if not suggestions:
-                    # Final fallback simple templates
-                    base_context = (prompt or description or 'artwork').strip() or 'artwork'
-                    is_product = content_type == 'product'
-                    titles = [
-                        f"{base_context.capitalize()}: A Visual Story",
-                        f"{base_context.capitalize()} — Limited Edition",
-                        f"The Essence of {base_context.capitalize()}"
-                    ]
-                    descs = [
-                        "Handcrafted piece with meticulous detail.",
-                        "Original work. Premium materials, gallery-ready finish.",
-                        "Expressive composition. Ships safely, ready to display."
-                    ] if is_product else [
-                        "An exploration through texture, light, and color.",
-                        "Captures movement and mood with layered technique.",
-                        "A contemplative blend of technique and emotion."
-                    ]
-                    suggestions = [{ 'title': titles[i], 'description': descs[i]} for i in range(3)]
 
-                return {'ok': True, 'suggestions': suggestions}
-            except Exception as e:
-                return {'ok': False, 'error': f'Gemini error: {str(e)}'}
+def stream_copy_suggestions(content_type: str, prompt: str = '', description: str = '',
+                            image_url: str = '', image_base64: str = '', image_mime: str = '',
+                            api_key: str = None, image_bytes: Optional[bytes] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of generate_copy_suggestions. Yields {'ok': True, 'suggestion': {...}}
+    for each suggestion as soon as the model has produced it, or a single {'ok': False, 'error': ...}.
+    """
+    content_type = (content_type or 'post').lower()
+    prompt = (prompt or '').strip()
+    description = (description or '').strip()
+    image_url = (image_url or '').strip()
+    if not (image_url or image_base64 or image_bytes):
+        yield {'ok': False, 'error': 'Image is required (URL or file) to generate suggestions.'}
+        return
 
-        # Fallback stub generation when Gemini not configured
-        base_context = (prompt or description or 'artwork').strip() or 'artwork'
-        titles = [
-            f"{base_context.capitalize()}: A Visual Story",
-            f"{base_context.capitalize()} — Limited Edition",
-            f"The Essence of {base_context.capitalize()}"
-        ]
-        is_product = content_type == 'product'
-        descriptions = [
-            "Handcrafted piece with meticulous detail.",
-            "Original work. Premium materials, gallery-ready finish.",
-            "Expressive composition. Ships safely, ready to display."
-        ] if is_product else [
-            "An exploration through texture, light, and color.",
-            "Captures movement and mood with layered technique.",
-            "A contemplative blend of technique and emotion."
-        ]
-        suggestions = [{'title': titles[i], 'description': descriptions[i]} for i in range(3)]
-        return {'ok': True, 'suggestions': suggestions}
+    if not is_configured(api_key):
+        for suggestion in _stub_suggestions(content_type, prompt, description):
+            yield {'ok': True, 'suggestion': suggestion}
+        return
+
+    sent = 0
+    text = ''
+    try:
+        model = _copy_model(api_key)
+        parts = _copy_request_parts(content_type, prompt, description, image_url, image_base64, image_mime,
+                                    image_bytes)
+        scanner = JsonObjectStream()
+        for chunk in model.generate_content(parts, stream=True):
+            piece = _response_text(chunk)
+            text += piece
+            for item in scanner.feed(piece):
+                cleaned = _clean_suggestion(item)
+                if cleaned and sent < 3:
+                    sent += 1
+                    yield {'ok': True, 'suggestion': cleaned}
     except Exception as e:
-        return {'ok': False, 'error': str(e)}
+        if not sent:
+            yield {'ok': False, 'error': f'Gemini error: {str(e)}'}
+        return
+
+    if not sent:
+        # Nothing parseable streamed; fall back to whole-text parsing, then templates
+        for suggestion in (_suggestions_from_text(text.strip()) or _stub_suggestions(content_type, prompt, description)):
+            yield {'ok': True, 'suggestion': suggestion}
 
 
 def translate_listing(content_type: str, title: str = '', description: str = '', 
@@ -246,16 +451,16 @@ def translate_listing(content_type: str, title: str = '', description: str = '',
         if not source_lang:
             source_lang = guess_lang((title + "\n" + description).strip())
 
-        if genai and api_key and api_key != "your_gemini_api_key_here":
+        if is_configured(api_key):
             try:
-                genai.configure(api_key=api_key)
-                model = genai.GenerativeModel(
-                    model_name='gemini-2.5-pro',
-                    generation_config={
+                model = get_model(
+                    GEMINI_MODEL_TRANSLATE,
+                    {
                         'temperature': 0.3,
                         'top_p': 0.8,
                         'response_mime_type': 'application/json'
-                    }
+                    },
+                    api_key
                 )
                 instruction = (
                     "You are a localization assistant for an art marketplace. "
@@ -344,7 +549,8 @@ def generate_portfolio_narrative(artist_name: str, posts: List[Dict], products:
     return f"Welcome to {artist_name}'s artistic journey, a collection that weaves together {total_works} unique pieces into a compelling narrative of creativity and expression. This collection includes {posts_count} community-shared works that showcase the artist's creative process, alongside {products_count} carefully crafted pieces available for acquisition. Together, these works form a cohesive narrative that invites viewers to explore {artist_name}'s unique perspective and artistic voice."
 
 
-def generate_enhanced_portfolio_narrative(artist_name: str, posts: List[Dict], products: List[Dict], user_location: str = None) -> str:
+def generate_enhanced_portfolio_narrative(artist_name: str, posts: List[Dict], products: List[Dict], user_location: str = None,
+                                          api_key: str = None) -> str:
     """
     Generate an AI-powered portfolio narrative using Google Gemini API.
     Analyzes all artwork and creates a compelling story connecting the works.
@@ -354,24 +560,19 @@ def generate_enhanced_portfolio_narrative(artist_name: str, posts: List[Dict], p
         return f"Welcome to {artist_name}'s creative space. This collection is just beginning to take shape."
     
     try:
-        # Import Gemini here to avoid import errors if not available
-        import google.generativeai as genai
-        from config import GEMINI_API_KEY
-        
         # Check if Gemini is available and configured
-        api_key = GEMINI_API_KEY
-        if not genai or not api_key or api_key == "your_gemini_api_key_here":
+        api_key = api_key or GEMINI_API_KEY
+        if not is_configured(api_key):
             return generate_portfolio_narrative(artist_name, posts, products)
         
-        # Configure Gemini
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            model_name='gemini-2.5-pro',
-            generation_config={
+        model = get_model(
+            GEMINI_MODEL_NARRATIVE,
+            {
                 'temperature': 0.7,
                 'top_p': 0.9,
                 'max_output_tokens': 500,
-            }
+            },
+            api_key
         )
         
         # Prepare comprehensive data for AI analysis
@@ -1,16 +1,41 @@
 # type: ignore[import]
-from datetime import date
+from datetime import datetime
 import os
 from dotenv import load_dotenv
 import natural_search 
-import ai
+import fulltext
+import search_index
+import jobs
+import translation_memory
+import thumbnails
+import blobstore
+import image_fetch
+import assets
+import querycount
+import dbengine
+import dbrouting
+import usercache
+import passwords
+import throttle
+import storage
 import uuid
+import ai
+import base64
+import io
+import hashlib
+import threading
 
 # Load environment variables from .env file
 load_dotenv()
 from werkzeug.utils import secure_filename
-from flask import Flask, abort, render_template, redirect, url_for, flash, request, jsonify
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
+from flask import Flask, abort, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context
 import json
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import click
+from flask.cli import AppGroup
 # Type hints for better IDE support
 from typing import Optional, Dict, Any, List
 from flask_bootstrap5 import Bootstrap
@@ -18,10 +43,10 @@ from flask_ckeditor import CKEditor
 # from flask_gravatar import Gravatar
 from flask_login import UserMixin, login_user, LoginManager, current_user, logout_user, login_required
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Integer, String, Text
+from flask_migrate import Migrate, upgrade as migrate_upgrade
+from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column, selectinload
+from sqlalchemy import Integer, String, Text, tuple_
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
 
 app = Flask(__name__, static_folder='static')
 # Load configuration from config.py
@@ -34,8 +59,20 @@ app.config['SECRET_KEY'] = FLASK_SECRET_KEY
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Reverse proxies in front of the app (Railway/Render add one) whose X-Forwarded-For/-Proto
+# are trusted, so request.remote_addr is the client rather than the proxy
+app.config['PROXY_FIX_HOPS'] = int(os.getenv('PROXY_FIX_HOPS', 1 if os.getenv('FLASK_ENV') == 'production' else 0))
+if app.config['PROXY_FIX_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_HOPS'],
+                            x_proto=app.config['PROXY_FIX_HOPS'])
+
+# Feed pagination: default page size and the hard cap for ?limit=
+FEED_PAGE_SIZE = 24
+FEED_PAGE_SIZE_MAX = 60
 
 ckeditor = CKEditor(app)
+# Content-hashed CSS/JS URLs and far-future caching for static files
+static_assets = assets.Assets(app)
 Bootstrap(app)
 
 # Configure Flask-Login
@@ -47,7 +84,8 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.get_or_404(User, user_id)
+    # Usually answered from the identity cache or session snapshot (see usercache.py)
+    return user_cache.load(user_id)
 
 
 class Base(DeclarativeBase):
@@ -65,8 +103,23 @@ if os.getenv('FLASK_ENV') == 'production':
 else:
     # Use SQLite for development
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///clyst.db'
-db = SQLAlchemy(model_class=Base)
+# WAL mode for SQLite, env-sized pool for Postgres (see dbengine.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dbengine.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# Optional read replica for read-only views (see dbrouting.py)
+REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+if REPLICA_URL:
+    app.config['SQLALCHEMY_BINDS'] = {
+        dbrouting.REPLICA_BIND: dbrouting.replica_bind(REPLICA_URL, dbengine.engine_options(REPLICA_URL)),
+    }
+db = SQLAlchemy(model_class=Base, session_options={'class_': dbrouting.RoutingSession})
 db.init_app(app)
+dbengine.init_app(app, db)
+dbrouting.init_app(app, db)
+# Schema changes are Alembic migrations under migrations/; run "flask --app app db upgrade" on deploy
+migrate = Migrate(app, db)
+
+# Per-request query budget: over-budget requests are logged (and fail under app.testing)
+query_counter = querycount.QueryCounter(app, budget=int(os.getenv('QUERY_BUDGET', 15)))
 
 # Database creation will be done at the end
 
@@ -91,25 +144,108 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def save_uploaded_file(file, folder_name):
+def save_uploaded_file(file):
+    """
+    Store an upload content-addressed (see blobstore) and return its URL path. Takes
+    a blob reference in the current transaction, so commit it with the listing.
+    """
     if file and allowed_file(file.filename):
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        
-        # Create folder if it doesn't exist
-        folder_path = os.path.join(app.config['UPLOAD_FOLDER'], folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(folder_path, unique_filename)
-        file.save(file_path)
-        
-        # Return URL path for database storage
-        url_path = f"/static/uploads/{folder_name}/{unique_filename}"
-        return url_path
+        ext = secure_filename(file.filename).rsplit('.', 1)[1].lower()
+        return blobs.save(file.stream, ext)
     return None
 
+
+def direct_upload_key(key):
+    """
+    Validate a storage key from a presigned direct upload (see /api/uploads/presign):
+    it must be one of the current user's incoming uploads and actually exist.
+    """
+    key = (key or '').strip()
+    if not key or '..' in key or not key.startswith(f"incoming/{current_user.id}/"):
+        return None
+    if not allowed_file(key) or not blobs.storage.exists(key):
+        return None
+    return key
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def get_page_size():
+    """
+    Read the requested page size from ?limit=, clamped to the feed cap.
+    """
+    try:
+        size = int(request.args.get('limit', FEED_PAGE_SIZE))
+    except (TypeError, ValueError):
+        size = FEED_PAGE_SIZE
+    return max(1, min(size, FEED_PAGE_SIZE_MAX))
+
+
+def encode_cursor(*values):
+    # Opaque, URL-safe cursor so the page boundary can round-trip through links
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if isinstance(values, list) and values:
+            return values
+    except Exception:
+        pass
+    return None
+
+
+def paginate_keyset(query, created_column, id_column, cursor, page_size):
+    """
+    Fetch one newest-first page of `query` using keyset pagination on
+    (created_column, id_column), which the (created_at, id) indexes serve directly.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    last = decode_cursor(cursor)
+    if last and len(last) == 2:
+        try:
+            query = query.where(
+                tuple_(created_column, id_column) < tuple_(datetime.fromisoformat(last[0]), int(last[1]))
+            )
+        except (TypeError, ValueError):
+            pass
+    # Fetch one extra row to know whether another page exists
+    query = query.order_by(created_column.desc(), id_column.desc()).limit(page_size + 1)
+    items = db.session.execute(query).scalars().all()
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last_item = items[-1]
+        next_cursor = encode_cursor(getattr(last_item, created_column.key).isoformat(),
+                                    getattr(last_item, id_column.key))
+    return items, next_cursor
+
+
+DATE_FORMAT = "%B %d, %Y"
+
+
+def format_date(value):
+    """
+    Display form of a created_at timestamp, e.g. "March 05, 2025".
+    """
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    return value or ''
+
+
+app.add_template_filter(format_date, 'format_date')
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
 
@@ -119,7 +255,7 @@ class User(UserMixin, db.Model):
     password_hash: Mapped[Optional[str]] = mapped_column(db.String(255))
     phone: Mapped[Optional[str]] = mapped_column(db.String(20))
     location: Mapped[Optional[str]] = mapped_column(db.String(150))
-    created_at: Mapped[Optional[str]] = mapped_column(db.String(250))
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime, default=datetime.utcnow)
     posts = relationship("Posts", back_populates="artist")
     products = relationship("Product", back_populates="artist")
 
@@ -128,83 +264,279 @@ class Posts(db.Model):
     __tablename__ = 'posts'
 
     post_id: Mapped[int] = mapped_column(db.Integer, primary_key=True, autoincrement=True)
-    artist_id: Mapped[int] = mapped_column(db.Integer, db.ForeignKey('users.id'))
+    artist_id: Mapped[int] = mapped_column(db.Integer, db.ForeignKey('users.id'), index=True)
     artist = relationship("User", back_populates="posts")
     post_title: Mapped[Optional[str]] = mapped_column(db.String(255))
     description: Mapped[Optional[str]] = mapped_column(db.Text)
     media_url: Mapped[Optional[str]] = mapped_column(db.String(255))
-    created_at: Mapped[Optional[str]] = mapped_column(db.String(255))
+    # JSON list of resized copies of an uploaded media_url, see thumbnails.make_variants
+    media_variants: Mapped[Optional[str]] = mapped_column(db.Text)
+    # Intrinsic size and inline data: URI placeholder, filled in with the variants
+    media_width: Mapped[Optional[int]] = mapped_column(db.Integer)
+    media_height: Mapped[Optional[int]] = mapped_column(db.Integer)
+    media_placeholder: Mapped[Optional[str]] = mapped_column(db.Text)
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime, default=datetime.utcnow)
+
+    # Newest-first feed: ORDER BY created_at DESC, post_id DESC walks this index
+    __table_args__ = (db.Index('ix_posts_created_at_id', 'created_at', 'post_id'),)
 
 
 class Product(db.Model):
     __tablename__ = 'products'
 
     product_id: Mapped[int] = mapped_column(db.Integer, primary_key=True, autoincrement=True)
-    artist_id: Mapped[int] = mapped_column(db.Integer, db.ForeignKey('users.id'))
+    artist_id: Mapped[int] = mapped_column(db.Integer, db.ForeignKey('users.id'), index=True)
     artist = relationship("User", back_populates="products")
     title: Mapped[Optional[str]] = mapped_column(db.String(150))
     description: Mapped[Optional[str]] = mapped_column(db.Text)
-    price: Mapped[Optional[float]] = mapped_column(db.Numeric(10, 2))
+    price: Mapped[Optional[float]] = mapped_column(db.Numeric(10, 2), index=True)
     img_url: Mapped[Optional[str]] = mapped_column(db.String(255))
+    img_variants: Mapped[Optional[str]] = mapped_column(db.Text)
+    img_width: Mapped[Optional[int]] = mapped_column(db.Integer)
+    img_height: Mapped[Optional[int]] = mapped_column(db.Integer)
+    img_placeholder: Mapped[Optional[str]] = mapped_column(db.Text)
     # category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id', ondelete='SET NULL'))
-    created_at: Mapped[Optional[str]] = mapped_column(db.String(250))
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_products_created_at_id', 'created_at', 'product_id'),)
+
+
+class PortfolioNarrative(db.Model):
+    __tablename__ = 'portfolio_narratives'
+
+    # One stored narrative per artist, valid while content_hash matches their works
+    artist_id: Mapped[int] = mapped_column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    content_hash: Mapped[str] = mapped_column(db.String(64))
+    narrative: Mapped[str] = mapped_column(db.Text)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_claim', 'status', 'kind', 'run_after'),)
+
+    id: Mapped[int] = mapped_column(db.Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(db.String(50))
+    status: Mapped[str] = mapped_column(db.String(20), default='queued')
+    payload: Mapped[Optional[str]] = mapped_column(db.Text)
+    result: Mapped[Optional[str]] = mapped_column(db.Text)
+    error: Mapped[Optional[str]] = mapped_column(db.Text)
+    # Only this user may poll the job; None means public (e.g. profile narratives)
+    owner_id: Mapped[Optional[int]] = mapped_column(db.Integer, db.ForeignKey('users.id'))
+    dedupe_key: Mapped[Optional[str]] = mapped_column(db.String(255), index=True)
+    attempts: Mapped[int] = mapped_column(db.Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(db.Integer, default=3)
+    run_after: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+
+
+class TranslationMemoryEntry(db.Model):
+    __tablename__ = 'translation_memory'
+
+    # sha256 of normalized source text + content type + languages + locale
+    key: Mapped[str] = mapped_column(db.String(64), primary_key=True)
+    source_lang: Mapped[Optional[str]] = mapped_column(db.String(20))
+    target_lang: Mapped[Optional[str]] = mapped_column(db.String(20))
+    locale: Mapped[Optional[str]] = mapped_column(db.String(20))
+    result: Mapped[str] = mapped_column(db.Text)
+    hits: Mapped[int] = mapped_column(db.Integer, default=0)
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+    last_used_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+
+
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+
+    sha256: Mapped[str] = mapped_column(db.String(64), primary_key=True)
+    # Path under the blob root, e.g. "ab/cd/<sha256>.jpg"
+    path: Mapped[str] = mapped_column(db.String(255))
+    size: Mapped[int] = mapped_column(db.Integer)
+    refcount: Mapped[int] = mapped_column(db.Integer, default=0, index=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime)
+
+
+user_cache = usercache.UserCache(ttl=float(os.getenv('USER_CACHE_TTL', 60)),
+                                 snapshot_ttl=float(os.getenv('USER_SNAPSHOT_TTL', 300)))
+user_cache.init_app(app, db, User)
+
+# Password hashes are computed in a process pool; login and sign-up are throttled per IP and per email
+password_hasher = passwords.PasswordHasher(
+    method=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', 2)),
+    max_pending=int(os.getenv('PASSWORD_HASH_QUEUE', 8)),
+)
+auth_ip_throttle = throttle.TokenBucket(rate=float(os.getenv('AUTH_IP_RATE', 0.5)),
+                                        burst=float(os.getenv('AUTH_IP_BURST', 10)))
+auth_email_throttle = throttle.TokenBucket(rate=float(os.getenv('AUTH_EMAIL_RATE', 0.1)),
+                                           burst=float(os.getenv('AUTH_EMAIL_BURST', 5)))
+
+
+def auth_throttled(email):
+    """
+    Seconds to wait when this client or email is out of login/sign-up attempts, else None.
+    """
+    ip = request.remote_addr or 'unknown'
+    if not auth_ip_throttle.allow(ip):
+        return auth_ip_throttle.retry_after(ip)
+    key = (email or '').strip().lower()
+    if key and not auth_email_throttle.allow(key):
+        return auth_email_throttle.retry_after(key)
+    return None
+
+
+# Local disk by default; STORAGE_BACKEND=s3 for S3/MinIO (see storage.from_env)
+media_storage = storage.from_env(app.static_folder)
+blobs = blobstore.BlobStore(media_storage, os.path.join(app.instance_path, 'upload-tmp'))
+blobs.init_app(db, Blob)
+
+translations = translation_memory.TranslationMemory(capacity=int(os.getenv('TRANSLATION_MEMORY_SIZE', 2048)))
+translations.init_app(db, TranslationMemoryEntry)
+
+
+# Background workers for AI calls so page renders never wait on Gemini
+job_queue = jobs.JobQueue(workers=int(os.getenv('JOB_WORKERS', 2)))
+job_queue.init_app(app, db, Job)
+
+
+@app.before_request
+def start_job_workers():
+    # Started per serving process (and again after a fork), not in CLI commands
+    job_queue.start()
+
+
+def _search_documents(kind, after_id=0):
+    # Loader for the in-memory search index: (id, title, description, artist name) rows
+    with app.app_context():
+        if kind == 'posts':
+            stmt = (db.select(Posts.post_id, Posts.post_title, Posts.description, User.name)
+                    .outerjoin(Posts.artist).where(Posts.post_id > after_id))
+        else:
+            stmt = (db.select(Product.product_id, Product.title, Product.description, User.name)
+                    .outerjoin(Product.artist).where(Product.product_id > after_id))
+        return db.session.execute(stmt).all()
+
+
+search_engine = search_index.SearchIndex(_search_documents)
+
+
+@app.before_request
+def warm_search_index():
+    # Built by the serving process once the schema exists, not at import or in CLI
+    # commands; until it is ready, searches use the full-text index
+    search_engine.ensure_warm()
+
+
+# Hits scored per ranked search request; SQL filters pick the page from these. When
+# the filters reject most of them, further windows (growing up to RANKED_MAX_WINDOW,
+# which also bounds the ids sent in one IN list) are scored until the page fills
+RANKED_CANDIDATES = 1000
+RANKED_MAX_WINDOW = 8000
+
+
+def paginate_ranked(kind, model, pk_column, keywords, cursor, page_size, filters=(), options=()):
+    """
+    Fetch one page of BM25-ranked results from the in-memory index. Hits below the
+    cursor are scored in windows of RANKED_CANDIDATES or more; `filters` (SQL
+    conditions such as price bounds) are applied to each window's ids in a single
+    query, and windows are pulled until the page fills or the hits run out.
+    `options` are loader options (e.g. selectinload) for the row query.
+    Returns (items, next_cursor) like paginate_keyset.
+    """
+    after = None
+    last = decode_cursor(cursor)
+    if last and len(last) == 2:
+        try:
+            after = (float(last[0]), int(last[1]))
+        except (TypeError, ValueError):
+            after = None
+    kept = []
+    window = RANKED_CANDIDATES
+    while True:
+        hits = search_engine.search(kind, keywords, window, after)
+        if hits and filters:
+            matching = set(db.session.execute(
+                db.select(pk_column).where(pk_column.in_([doc_id for _, doc_id in hits]), *filters)
+            ).scalars())
+            kept.extend(hit for hit in hits if hit[1] in matching)
+        else:
+            kept.extend(hits)
+        if len(kept) > page_size or len(hits) < window:
+            break
+        after = hits[-1]
+        window = min(window * 2, RANKED_MAX_WINDOW)
+    next_cursor = None
+    if len(kept) > page_size:
+        kept = kept[:page_size]
+        next_cursor = encode_cursor(*kept[-1])
+    if not kept:
+        return [], next_cursor
+    # Rows deleted by another worker may still be indexed here; they simply drop out
+    rows = db.session.execute(db.select(model).options(*options)
+                              .where(pk_column.in_([doc_id for _, doc_id in kept]))).scalars()
+    by_id = {getattr(row, pk_column.key): row for row in rows}
+    return [by_id[doc_id] for _, doc_id in kept if doc_id in by_id], next_cursor
 
 
 @app.route('/', methods=["GET", "POST"])
+@dbrouting.read_only
 def home():
     # Optional natural language query parsing for posts
     q = (request.args.get('q') or '').strip()
-    posts_query = db.select(Posts)
+    cursor = request.args.get('cursor')
+    page_size = get_page_size()
+    # Cards show the artist's name; load them in one query rather than one per card
+    artist = selectinload(Posts.artist)
+    posts_query = db.select(Posts).options(artist)
     if q:
         parsed = natural_search.parse_search_query(q)
         tokens = parsed.get('keywords', [])
-        # Apply text filters across title/description
-        joined_artist = False
-        for tk in tokens:
-            like = f"%{tk}%"
-            if not joined_artist:
-                posts_query = posts_query.join(Posts.artist)
-                joined_artist = True
-            posts_query = posts_query.where(
-                (Posts.post_title.ilike(like)) | (Posts.description.ilike(like)) | (User.name.ilike(like))
-            )
-    result = db.session.execute(posts_query)
-    posts = result.scalars().all()
-    return render_template("index.html", posts=posts, current_user=current_user, q=q)
+        # Rank with the in-memory BM25 index; use the full-text index while it warms up
+        if tokens and search_engine.ready:
+            posts, next_cursor = paginate_ranked('posts', Posts, Posts.post_id, tokens, cursor, page_size,
+                                                 options=(artist,))
+            return render_template("index.html", posts=posts, current_user=current_user, q=q,
+                                   next_cursor=next_cursor, cursor=cursor)
+        match = fulltext.match_clause(db.session, 'posts', Posts.post_id, tokens)
+        if match is not None:
+            posts_query = posts_query.where(match)
+    posts, next_cursor = paginate_keyset(posts_query, Posts.created_at, Posts.post_id, cursor, page_size)
+    return render_template("index.html", posts=posts, current_user=current_user, q=q,
+                           next_cursor=next_cursor, cursor=cursor)
 
 @app.route('/products')
+@dbrouting.read_only
 def products_page():
     # Optional natural language query parsing for products
     q = (request.args.get('q') or '').strip()
-    prod_query = db.select(Product)
+    cursor = request.args.get('cursor')
+    page_size = get_page_size()
+    artist = selectinload(Product.artist)
+    prod_query = db.select(Product).options(artist)
     if q:
         parsed = natural_search.parse_search_query(q)
         tokens = parsed.get('keywords', [])
         max_price = parsed.get('max_price')
         min_price = parsed.get('min_price')
-        joined_artist = False
-        for tk in tokens:
-            like = f"%{tk}%"
-            if not joined_artist:
-                prod_query = prod_query.join(Product.artist)
-                joined_artist = True
-            prod_query = prod_query.where(
-                (Product.title.ilike(like)) | (Product.description.ilike(like)) | (User.name.ilike(like))
-            )
+        price_filters = []
         if max_price is not None:
-            try:
-                # Product.price is Numeric; cast comparison directly
-                prod_query = prod_query.where(Product.price <= max_price)
-            except Exception:
-                pass
+            price_filters.append(Product.price <= max_price)
         if min_price is not None:
-            try:
-                prod_query = prod_query.where(Product.price >= min_price)
-            except Exception:
-                pass
-    result = db.session.execute(prod_query)
-    products = result.scalars().all()
-    return render_template('products.html', products=products, current_user=current_user, q=q)
+            price_filters.append(Product.price >= min_price)
+        if tokens and search_engine.ready:
+            products, next_cursor = paginate_ranked('products', Product, Product.product_id, tokens,
+                                                    cursor, page_size, filters=price_filters, options=(artist,))
+            return render_template('products.html', products=products, current_user=current_user, q=q,
+                                   next_cursor=next_cursor, cursor=cursor)
+        match = fulltext.match_clause(db.session, 'products', Product.product_id, tokens)
+        if match is not None:
+            prod_query = prod_query.where(match)
+        if price_filters:
+            prod_query = prod_query.where(*price_filters)
+    products, next_cursor = paginate_keyset(prod_query, Product.created_at, Product.product_id, cursor, page_size)
+    return render_template('products.html', products=products, current_user=current_user, q=q,
+                           next_cursor=next_cursor, cursor=cursor)
 
 
 @app.route("/login", methods=["GET", "POST"])
@@ -212,9 +544,22 @@ def login():
     if request.method == "POST":
         email = request.form.get('email')
         password = request.form.get('password')
+        retry_after = auth_throttled(email)
+        if retry_after is not None:
+            flash('Too many attempts. Please wait a moment and try again.')
+            return render_template("login.html", current_user=current_user), 429, {'Retry-After': str(retry_after)}
         user = db.session.execute(db.select(User).where(User.email == email)).scalar()
         
-        if user and password and check_password_hash(user.password_hash, password):
+        try:
+            valid = bool(user and password and password_hasher.verify(user.password_hash, password))
+            if valid and password_hasher.needs_rehash(user.password_hash):
+                # Stored with older hash settings; upgrade it while we have the password
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+        except passwords.HasherBusy:
+            flash('We are busy right now. Please try again in a moment.')
+            return render_template("login.html", current_user=current_user), 503, {'Retry-After': '5'}
+        if valid:
             login_user(user)
             return redirect(url_for('home'))
         else:
@@ -238,6 +583,10 @@ def register():
         password = request.form.get('password')
         phone = request.form.get('phone')
         location = request.form.get('location')
+        retry_after = auth_throttled(email)
+        if retry_after is not None:
+            flash('Too many attempts. Please wait a moment and try again.')
+            return render_template("register.html", current_user=current_user), 429, {'Retry-After': str(retry_after)}
         
         # Check if user already exists
         existing_user = db.session.execute(db.select(User).where(User.email == email)).scalar()
@@ -250,14 +599,20 @@ def register():
             flash('Password is required')
             return render_template("register.html", current_user=current_user)
             
+        try:
+            password_hash = password_hasher.hash(password)
+        except passwords.HasherBusy:
+            flash('We are busy right now. Please try again in a moment.')
+            return render_template("register.html", current_user=current_user), 503, {'Retry-After': '5'}
+
         # type: ignore[call-arg]
         new_user = User(
             name=name,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=password_hash,
             phone=phone,
             location=location,
-            created_at=date.today().strftime("%B %d, %Y")
+            created_at=datetime.utcnow()
         )
         db.session.add(new_user)
         db.session.commit()
@@ -275,13 +630,19 @@ def add_posts():
         # Handle image upload
         media_url = request.form.get('post_image', '')
         
+        uploaded = False
+        # The browser may have uploaded straight to storage (see /api/uploads/presign)
+        upload_key = direct_upload_key(request.form.get('post_image_key'))
+        if upload_key:
+            media_url = blobs.storage.url(upload_key)
         # Check if file was uploaded
         if 'post_image_file' in request.files:
             file = request.files['post_image_file']
             if file.filename != '':
-                uploaded_path = save_uploaded_file(file, 'posts')
+                uploaded_path = save_uploaded_file(file)
                 if uploaded_path:
                     media_url = uploaded_path
+                    uploaded = True
         # Enforce that at least one image source is provided
         if not media_url:
             flash('Please provide an image URL or upload an image for the post.')
@@ -293,10 +654,16 @@ def add_posts():
             post_title=request.form['post_title'],
             description=request.form['description'],
             media_url=media_url,
-            created_at=date.today().strftime("%B %d, %Y")
+            created_at=datetime.utcnow()
         )
         db.session.add(new_post)
+        db.session.flush()
+        # Read before commit expires the row, so indexing doesn't reload it
+        post_id, title, description = new_post.post_id, new_post.post_title, new_post.description
+        fulltext.index_listing(db.session, 'posts', post_id, title, description, current_user.name)
         db.session.commit()
+        search_engine.add('posts', post_id, title, description, current_user.name)
+        queue_image_job('posts', post_id, media_url, uploaded, upload_key)
         return redirect(url_for('home'))
     return render_template("add_posts.html", current_user=current_user)
 
@@ -308,13 +675,19 @@ def add_products():
         # Handle image upload
         img_url = request.form.get('product_image', '')
         
+        uploaded = False
+        # The browser may have uploaded straight to storage (see /api/uploads/presign)
+        upload_key = direct_upload_key(request.form.get('product_image_key'))
+        if upload_key:
+            img_url = blobs.storage.url(upload_key)
         # Check if file was uploaded
         if 'product_image_file' in request.files:
             file = request.files['product_image_file']
             if file.filename != '':
-                uploaded_path = save_uploaded_file(file, 'products')
+                uploaded_path = save_uploaded_file(file)
                 if uploaded_path:
                     img_url = uploaded_path
+                    uploaded = True
         # Enforce that at least one image source is provided
         if not img_url:
             flash('Please provide an image URL or upload an image for the product.')
@@ -327,89 +700,409 @@ def add_products():
             description=request.form.get('description', ''),
             price=request.form['price'],
             img_url=img_url,
-            created_at=date.today().strftime("%B %d, %Y")
+            created_at=datetime.utcnow()
         )
         db.session.add(new_product)
+        db.session.flush()
+        product_id, title, description = new_product.product_id, new_product.title, new_product.description
+        fulltext.index_listing(db.session, 'products', product_id, title, description, current_user.name)
         db.session.commit()
+        search_engine.add('products', product_id, title, description, current_user.name)
+        queue_image_job('products', product_id, img_url, uploaded, upload_key)
         return redirect(url_for('products_page'))
     return render_template("add_products.html", current_user=current_user)
 
 
+# Listing model and the prefix of its image columns (<prefix>_url, <prefix>_variants, ...)
+LISTING_IMAGES = {
+    'posts': (Posts, 'media'),
+    'products': (Product, 'img'),
+}
+
+
+def queue_image_job(kind, listing_id, url, uploaded=False, upload_key=None):
+    """
+    Queue the background step that turns a new listing image into a stored blob with
+    variants: adopt a direct upload, resize a server-side upload, or ingest a remote URL.
+    """
+    payload = {'kind': kind, 'id': listing_id}
+    if upload_key:
+        job_queue.enqueue('adopt_upload', dict(payload, key=upload_key))
+    elif uploaded:
+        job_queue.enqueue('thumbnails', payload)
+    elif urlparse(url or '').scheme in ('http', 'https') and blobs.digest_for(url) is None:
+        job_queue.enqueue('ingest_image', dict(payload, url=url), dedupe_key=f"ingest:{kind}:{listing_id}")
+
+
+@job_queue.task('thumbnails', concurrency=2, max_attempts=2)
+def run_thumbnails(payload):
+    """
+    Generate responsive variants, intrinsic size and placeholder for a listing image.
+    """
+    model, prefix = LISTING_IMAGES[payload['kind']]
+    listing = db.session.get(model, payload['id'])
+    if listing is None:
+        return {'ok': False, 'error': 'Listing not found'}
+    image = thumbnails.make_variants(getattr(listing, f'{prefix}_url'), blobs)
+    if not image:
+        return {'ok': False, 'error': 'No variants generated'}
+    setattr(listing, f'{prefix}_variants', json.dumps(image['variants']))
+    setattr(listing, f'{prefix}_width', image['width'])
+    setattr(listing, f'{prefix}_height', image['height'])
+    setattr(listing, f'{prefix}_placeholder', image['placeholder'])
+    db.session.commit()
+    return {'ok': True, 'variants': len(image['variants'])}
+
+
+@job_queue.task('adopt_upload', concurrency=2, max_attempts=3)
+def run_adopt_upload(payload):
+    """
+    Move a direct-to-storage upload to its content address, then generate its variants.
+    """
+    model, prefix = LISTING_IMAGES[payload['kind']]
+    url_attr = f'{prefix}_url'
+    key = payload['key']
+    listing = db.session.get(model, payload['id'])
+    if listing is None or getattr(listing, url_attr) != blobs.storage.url(key):
+        # Listing deleted (or its image replaced) before the upload was adopted
+        blobs.storage.delete(key)
+        return {'ok': False, 'error': 'Listing not found'}
+    setattr(listing, url_attr, blobs.adopt(key, key.rsplit('.', 1)[1].lower()))
+    db.session.commit()
+    blobs.storage.delete(key)
+    return run_thumbnails(payload)
+
+
+@job_queue.task('ingest_image', concurrency=4, max_attempts=3, retry_delay=30.0)
+def run_ingest_image(payload):
+    """
+    Copy a remote listing image into blob storage and point the listing at our copy;
+    the original URL keeps being served until then.
+    """
+    model, prefix = LISTING_IMAGES[payload['kind']]
+    url_attr = f'{prefix}_url'
+    listing = db.session.get(model, payload['id'])
+    if listing is None or getattr(listing, url_attr) != payload['url']:
+        return {'ok': False, 'error': 'Listing not found'}
+    if not image_fetch.is_public_url(payload['url']):
+        # Private and internal hosts are never fetched, so retrying cannot help
+        return {'ok': False, 'error': 'Image host is not allowed'}
+    fetched = image_fetch.fetch_image(payload['url'])
+    if not fetched:
+        # Host down, too large or not an image; retried with backoff
+        raise RuntimeError(f"Could not fetch {payload['url']}")
+    ext = thumbnails.image_extension(*fetched)
+    if ext is None:
+        return {'ok': False, 'error': 'Not a supported image'}
+    setattr(listing, url_attr, blobs.save(io.BytesIO(fetched[0]), ext))
+    db.session.commit()
+    return run_thumbnails(payload)
+
+
+@app.route('/api/uploads/presign', methods=['POST'])
+@login_required
+def presign_upload():
+    """
+    Presigned POST for sending a listing image straight to object storage. The form
+    then submits the returned key (post_image_key / product_image_key) instead of the file.
+    """
+    if not blobs.storage.direct_uploads:
+        return jsonify({'ok': False, 'error': 'Direct uploads are not available'}), 404
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    content_type = data.get('content_type') or ''
+    if not allowed_file(filename) or not content_type.startswith('image/'):
+        return jsonify({'ok': False, 'error': 'Unsupported file type'}), 400
+    key = f"incoming/{current_user.id}/{uuid.uuid4().hex}.{filename.rsplit('.', 1)[1].lower()}"
+    try:
+        upload = blobs.storage.presign_upload(key, content_type, app.config['MAX_CONTENT_LENGTH'])
+    except Exception as e:
+        return jsonify({'ok': False, 'error': str(e)}), 500
+    return jsonify({'ok': True, 'key': key, 'url': upload['url'], 'fields': upload['fields']})
+
+
+app.add_template_filter(thumbnails.srcset, 'srcset')
+
+
+def sse_event(event, data):
+    # One Server-Sent Event frame with a JSON payload
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def local_image_url(url):
+    """
+    Reduce an absolute URL for one of our own uploads to its path, so the AI image
+    fetch reads the file from disk instead of making an HTTP request back to us.
+    """
+    url = (url or '').strip()
+    parsed = urlparse(url)
+    if parsed.netloc and parsed.netloc == request.host and parsed.path.startswith('/static/uploads/'):
+        return parsed.path
+    return url
+
+
+@job_queue.task('generate_copy', concurrency=2, max_attempts=3)
+def run_generate_copy(payload):
+    result = ai.generate_copy_suggestions(api_key=GEMINI_API_KEY, **payload)
+    # Gemini failures are worth retrying; validation errors are returned as-is
+    if not result['ok'] and str(result.get('error', '')).startswith('Gemini error'):
+        raise RuntimeError(result['error'])
+    return result
+
+
+# Gemini translation calls one process makes at a time, across queued jobs and batch requests
+TRANSLATE_CONCURRENCY = int(os.getenv('TRANSLATE_CONCURRENCY', 4))
+translate_slots = threading.BoundedSemaphore(TRANSLATE_CONCURRENCY)
+
+
+def gemini_translate(payload):
+    with translate_slots:
+        return ai.translate_listing(api_key=GEMINI_API_KEY, **payload)
+
+
+@job_queue.task('translate_listing', concurrency=2, max_attempts=3)
+def run_translate_listing(payload):
+    # Stub translations (no Gemini key) are not worth remembering
+    result = translations.translate(
+        payload,
+        lambda: gemini_translate(payload),
+        store=ai.is_configured(GEMINI_API_KEY)
+    )
+    if not result['ok'] and str(result.get('error', '')).startswith('Gemini error'):
+        raise RuntimeError(result['error'])
+    return result
+
+
+def read_limited(stream, limit):
+    """
+    Read a request or upload stream into a single buffer, aborting with 413 past `limit` bytes.
+    """
+    buf = bytearray()
+    while True:
+        chunk = stream.read(min(64 * 1024, limit + 1 - len(buf)))
+        if not chunk:
+            return buf
+        buf += chunk
+        if len(buf) > limit:
+            abort(413)
+
+
+def copy_request_params():
+    """
+    Suggestion parameters from a multipart form (file field 'image'), a raw image body
+    (text fields in the query string) or the legacy JSON body with base64 image data.
+    """
+    limit = app.config['MAX_CONTENT_LENGTH']
+    image_bytes, image_mime = None, None
+    if request.mimetype == 'multipart/form-data':
+        fields = request.form
+        file = request.files.get('image')
+        if file and file.filename:
+            image_bytes = read_limited(file.stream, limit)
+            image_mime = file.mimetype
+    elif request.mimetype.startswith('image/'):
+        fields = request.args
+        image_bytes = read_limited(request.stream, limit)
+        image_mime = request.mimetype
+    else:
+        fields = request.get_json(silent=True) or {}
+        if fields.get('image_base64'):
+            try:
+                image_bytes = base64.b64decode(fields['image_base64'])
+                image_mime = fields.get('image_mime')
+            except Exception:
+                image_bytes = None
+    return {
+        'content_type': fields.get('type', 'post'),
+        'prompt': fields.get('prompt', ''),
+        'description': fields.get('description', ''),
+        'image_url': local_image_url(fields.get('image_url', '')),
+        # Passed on as read (a bytearray); prepare_image re-encodes it anyway
+        'image_bytes': image_bytes or None,
+        'image_mime': image_mime or 'image/jpeg',
+    }
+
+
 @app.route('/api/generate_copy', methods=['POST'])
 @login_required
 def generate_copy():
     """
-    Endpoint to generate title/description suggestions using AI.
+    Queue title/description suggestion generation; poll /api/jobs/<job_id> for the result.
+    Accepts multipart, a raw image body or JSON (see copy_request_params).
     """
     try:
-        data = request.get_json(silent=True) or {}
-        content_type = data.get('type', 'post')
-        prompt = data.get('prompt', '')
-        description = data.get('description', '')
-        image_url = data.get('image_url', '')
-        image_base64 = data.get('image_base64')
-        image_mime = data.get('image_mime')
-
-        # Call AI function
-        result = ai.generate_copy_suggestions(
-            content_type=content_type,
-            prompt=prompt,
-            description=description,
-            image_url=image_url,
-            image_base64=image_base64,
-            image_mime=image_mime,
-            api_key=GEMINI_API_KEY
-        )
-
-        if result['ok']:
-            return jsonify(result)
-        else:
-            return jsonify(result), 400
+        params = copy_request_params()
+        image_bytes = params.pop('image_bytes')
+        payload = dict(params, image_base64=None)
+        if image_bytes:
+            # Downscale before queueing so the job row carries a small image, not the upload
+            image_bytes, payload['image_mime'] = ai.prepare_image(image_bytes, params['image_mime'])
+            payload['image_base64'] = base64.b64encode(image_bytes).decode('ascii')
+        job = job_queue.enqueue('generate_copy', payload, owner_id=current_user.id)
+        return jsonify({'ok': True, 'job_id': job.id, 'status': job.status}), 202
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 500
 
 
+@app.route('/api/generate_copy/stream', methods=['POST'])
+@login_required
+def generate_copy_stream():
+    """
+    Stream title/description suggestions as Server-Sent Events, one 'suggestion' event per
+    suggestion as soon as the model completes it, then 'done' (or a single 'error').
+    Accepts the same bodies as /api/generate_copy.
+    """
+    params = copy_request_params()
+
+    def generate():
+        count = 0
+        for item in ai.stream_copy_suggestions(api_key=GEMINI_API_KEY, **params):
+            if not item['ok']:
+                yield sse_event('error', item)
+                return
+            yield sse_event('suggestion', dict(item['suggestion'], index=count))
+            count += 1
+        yield sse_event('done', {'ok': True, 'count': count})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/translate_listing', methods=['POST'])
 @login_required
 def translate_listing():
     """
-    Translate a listing's title/description into a target language and suggest SEO phrases.
+    Translate a listing's title/description into a target language with SEO phrases.
+    Remembered translations are returned directly; otherwise a job is queued and
+    the result is polled from /api/jobs/<job_id>.
     """
     try:
         data = request.get_json(silent=True) or {}
-        content_type = data.get('type', 'post')
-        title = data.get('title', '')
-        description = data.get('description', '')
-        target_lang = data.get('target_lang', '')
-        locale = data.get('locale', '')
-        source_lang = data.get('source_lang', '')
-
-        # Call AI function
-        result = ai.translate_listing(
-            content_type=content_type,
-            title=title,
-            description=description,
-            target_lang=target_lang,
-            locale=locale,
-            source_lang=source_lang,
-            api_key=GEMINI_API_KEY
-        )
-
-        if result['ok']:
-            return jsonify(result)
-        else:
-            return jsonify(result), 400
+        payload = {
+            'content_type': data.get('type', 'post'),
+            'title': data.get('title', ''),
+            'description': data.get('description', ''),
+            'target_lang': data.get('target_lang', ''),
+            'locale': data.get('locale', ''),
+            'source_lang': data.get('source_lang', ''),
+        }
+        remembered = translations.get(payload)
+        if remembered is not None:
+            return jsonify(remembered)
+        job = job_queue.enqueue('translate_listing', payload, owner_id=current_user.id,
+                                dedupe_key=f"translate:{current_user.id}:{translation_memory.make_key(**payload)}")
+        return jsonify({'ok': True, 'job_id': job.id, 'status': job.status}), 202
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 500
 
 
+# Batch translation fan-out: threads per request (Gemini calls are capped by
+# TRANSLATE_CONCURRENCY process-wide) and the most languages accepted at once
+TRANSLATE_BATCH_WORKERS = int(os.getenv('TRANSLATE_BATCH_WORKERS', 4))
+TRANSLATE_BATCH_MAX_LANGS = 12
+
+
+@app.route('/api/translate_listing/batch', methods=['POST'])
+@login_required
+def translate_listing_batch():
+    """
+    Translate a listing into several target languages at once. Languages are translated
+    concurrently and each result is streamed back as a Server-Sent Event when it finishes.
+    """
+    data = request.get_json(silent=True) or {}
+    target_langs = data.get('target_langs') or []
+    if not isinstance(target_langs, list):
+        return jsonify({'ok': False, 'error': 'target_langs must be a list'}), 400
+    # De-duplicate while keeping the requested order
+    target_langs = list(dict.fromkeys(str(lang).strip().lower() for lang in target_langs if str(lang).strip()))
+    if not target_langs:
+        return jsonify({'ok': False, 'error': 'target_langs is required'}), 400
+    if len(target_langs) > TRANSLATE_BATCH_MAX_LANGS:
+        return jsonify({'ok': False, 'error': f'At most {TRANSLATE_BATCH_MAX_LANGS} languages per batch'}), 400
+    base = {
+        'content_type': data.get('type', 'post'),
+        'title': data.get('title', ''),
+        'description': data.get('description', ''),
+        'locale': data.get('locale', ''),
+        'source_lang': data.get('source_lang', ''),
+    }
+    store = ai.is_configured(GEMINI_API_KEY)
+
+    def translate_one(lang):
+        payload = dict(base, target_lang=lang)
+        with app.app_context():
+            # Remembered languages return at once; the rest share translate_slots with
+            # other batches and queued jobs
+            return translations.translate(
+                payload,
+                lambda: gemini_translate(payload),
+                store=store
+            )
+
+    def generate():
+        executor = ThreadPoolExecutor(max_workers=min(TRANSLATE_BATCH_WORKERS, len(target_langs)))
+        try:
+            futures = {executor.submit(translate_one, lang): lang for lang in target_langs}
+            for future in as_completed(futures):
+                lang = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'ok': False, 'error': str(e)}
+                yield sse_event('translation', dict(result, target_lang=lang))
+            yield sse_event('done', {'ok': True, 'count': len(target_langs)})
+        finally:
+            # Client went away: drop languages that have not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/metrics/translation_memory')
+@admin_only
+def translation_memory_metrics():
+    """
+    Translation memory hit rate and latency saved for this process, plus stored totals.
+    """
+    stored = db.session.execute(
+        db.select(db.func.count(TranslationMemoryEntry.key), db.func.sum(TranslationMemoryEntry.hits))
+    ).one()
+    return jsonify({
+        'ok': True,
+        'process': translations.metrics(),
+        'stored_entries': stored[0] or 0,
+        'stored_hits': int(stored[1] or 0),
+    })
+
+
+@app.route('/api/jobs/<int:job_id>')
+def job_status(job_id):
+    """
+    Poll a background job. Result is the AI function's response once status is 'done'.
+    """
+    job = db.get_or_404(Job, job_id)
+    if job.owner_id is not None and (not current_user.is_authenticated or current_user.id != job.owner_id):
+        abort(404)
+    return jsonify(job_queue.describe(job))
+
+
 @app.route("/delete_post")
 @login_required
 def delete_posts():
     post_id = request.args.get('post_id')
     post_to_delete = db.get_or_404(Posts, post_id)
+    fulltext.remove_listing(db.session, 'posts', post_to_delete.post_id)
     db.session.delete(post_to_delete)
+    managed = blobs.release(post_to_delete.media_url)
     db.session.commit()
+    search_engine.remove('posts', post_to_delete.post_id)
+    if managed:
+        blobs.collect()
+    else:
+        remove_files(thumbnails.variant_paths(post_to_delete.media_variants))
     return redirect(url_for('home'))
 
 
@@ -418,106 +1111,175 @@ def delete_posts():
 def delete_products():
     product_id = request.args.get('product_id')
     product_to_delete = db.get_or_404(Product, product_id)
+    fulltext.remove_listing(db.session, 'products', product_to_delete.product_id)
     db.session.delete(product_to_delete)
+    managed = blobs.release(product_to_delete.img_url)
     db.session.commit()
+    search_engine.remove('products', product_to_delete.product_id)
+    if managed:
+        blobs.collect()
+    else:
+        remove_files(thumbnails.variant_paths(product_to_delete.img_variants))
     return redirect(url_for('products_page'))
 
 
-@app.route("/profile")
-@login_required
-def profile():
-    # Get current user's posts and products
-    user_posts = db.session.execute(db.select(Posts).where(Posts.artist_id == current_user.id)).scalars().all()
-    user_products = db.session.execute(db.select(Product).where(Product.artist_id == current_user.id)).scalars().all()
-    
-    # Generate portfolio narrative
-    from ai import generate_enhanced_portfolio_narrative
-    
-    # Convert posts to dictionaries for AI analysis
+def build_portfolio_payload(user_posts, user_products):
+    """
+    Convert an artist's posts and products to the dictionaries the AI narrative expects.
+    """
     posts_data = []
     for post in user_posts:
         posts_data.append({
             'post_title': post.post_title,
             'post_description': post.description,
             'media_url': post.media_url,
-            'created_at': post.created_at
+            'created_at': format_date(post.created_at)
         })
-    
-    # Convert products to dictionaries for AI analysis
+
     products_data = []
     for product in user_products:
         products_data.append({
             'title': product.title,
             'description': product.description,
-            'price': product.price,
+            # Decimal is not JSON serialisable, and the prompt only needs the amount
+            'price': float(product.price) if product.price is not None else None,
             'img_url': product.img_url,
-            'created_at': product.created_at
+            'created_at': format_date(product.created_at)
         })
-    
-    # Generate the portfolio narrative
-    portfolio_narrative = generate_enhanced_portfolio_narrative(
-        artist_name=current_user.name,
+    return posts_data, products_data
+
+
+def portfolio_content_hash(user, posts_data, products_data):
+    # Everything the narrative prompt sees, so any change yields a new hash
+    payload = {
+        'name': user.name,
+        'location': user.location,
+        'posts': posts_data,
+        'products': products_data,
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get_portfolio_narrative(user, user_posts, user_products, force=False):
+    """
+    Return the artist's portfolio narrative, generating it only when the stored copy
+    is missing or was built from different works. Calls Gemini inline; page views
+    use portfolio_narrative_for_view instead.
+    """
+    posts_data, products_data = build_portfolio_payload(user_posts, user_products)
+    content_hash = portfolio_content_hash(user, posts_data, products_data)
+    stored = db.session.get(PortfolioNarrative, user.id)
+    if stored and stored.content_hash == content_hash and not force:
+        return stored.narrative
+
+    narrative = ai.generate_enhanced_portfolio_narrative(
+        artist_name=user.name,
         posts=posts_data,
         products=products_data,
-        user_location=current_user.location
+        user_location=user.location,
+        api_key=GEMINI_API_KEY
     )
-    
+    # Only persist real AI output; the template fallbacks are free to rebuild
+    if not posts_data and not products_data:
+        return narrative
+    if narrative == ai.generate_portfolio_narrative(user.name, posts_data, products_data):
+        return narrative
+    if stored is None:
+        stored = PortfolioNarrative(artist_id=user.id)
+        db.session.add(stored)
+    stored.content_hash = content_hash
+    stored.narrative = narrative
+    stored.updated_at = datetime.utcnow()
+    db.session.commit()
+    return narrative
+
+
+# How long a narrative job that stored nothing (Gemini failed or was unavailable) is
+# handed to later profile views before another one is queued
+NARRATIVE_RETRY_SECONDS = float(os.getenv('NARRATIVE_RETRY_SECONDS', 600))
+
+
+def portfolio_narrative_for_view(user, user_posts, user_products):
+    """
+    Resolve the narrative for a profile page without waiting on Gemini.
+    Returns (narrative, job_id): a stored or fallback narrative with job_id None,
+    or None plus the id of the background job generating it.
+    """
+    posts_data, products_data = build_portfolio_payload(user_posts, user_products)
+    if not posts_data and not products_data:
+        return ai.generate_portfolio_narrative(user.name, posts_data, products_data), None
+    content_hash = portfolio_content_hash(user, posts_data, products_data)
+    # The profile page reads from the replica, but this lookup may end in a write: read
+    # the current narrative and any queued job from the primary so a lagging replica
+    # doesn't queue a duplicate
+    with dbrouting.primary():
+        stored = db.session.get(PortfolioNarrative, user.id)
+        if stored and stored.content_hash == content_hash:
+            return stored.narrative, None
+        if not ai.is_configured(GEMINI_API_KEY):
+            return ai.generate_portfolio_narrative(user.name, posts_data, products_data), None
+        # A job that ended in the fallback text stored nothing; reuse it for a while
+        # rather than queueing another Gemini call on every view
+        job = job_queue.enqueue('portfolio_narrative', {'artist_id': user.id},
+                                dedupe_key=f"narrative:{user.id}:{content_hash}",
+                                reuse_for=NARRATIVE_RETRY_SECONDS)
+        return None, job.id
+
+
+@job_queue.task('portfolio_narrative', concurrency=1, max_attempts=2)
+def run_portfolio_narrative(payload):
+    user = db.session.get(User, payload['artist_id'])
+    if user is None:
+        return {'ok': False, 'error': 'Artist not found'}
+    user_posts = db.session.execute(db.select(Posts).where(Posts.artist_id == user.id)).scalars().all()
+    user_products = db.session.execute(db.select(Product).where(Product.artist_id == user.id)).scalars().all()
+    return {'ok': True, 'narrative': get_portfolio_narrative(user, user_posts, user_products)}
+
+
+@app.route("/profile")
+@login_required
+def profile():
+    # Get current user's posts and products
+    user_posts = db.session.execute(
+        db.select(Posts).options(selectinload(Posts.artist)).where(Posts.artist_id == current_user.id)).scalars().all()
+    user_products = db.session.execute(
+        db.select(Product).options(selectinload(Product.artist)).where(Product.artist_id == current_user.id)).scalars().all()
+
+    portfolio_narrative, narrative_job_id = portfolio_narrative_for_view(current_user, user_posts, user_products)
+
     return render_template("profile.html", 
                          current_user=current_user,
                          profile_user=current_user, 
                          posts=user_posts, 
                          products=user_products,
-                         portfolio_narrative=portfolio_narrative)
+                         portfolio_narrative=portfolio_narrative,
+                         narrative_job_id=narrative_job_id)
 
 
 @app.route("/profile/<int:user_id>")
+@dbrouting.read_only
 def view_profile(user_id):
     # Get user's posts and products for public profile view
     user = db.get_or_404(User, user_id)
-    user_posts = db.session.execute(db.select(Posts).where(Posts.artist_id == user_id)).scalars().all()
-    user_products = db.session.execute(db.select(Product).where(Product.artist_id == user_id)).scalars().all()
-    
-    # Generate portfolio narrative
-    from ai import generate_enhanced_portfolio_narrative
-    
-    # Convert posts to dictionaries for AI analysis
-    posts_data = []
-    for post in user_posts:
-        posts_data.append({
-            'post_title': post.post_title,
-            'post_description': post.description,
-            'media_url': post.media_url,
-            'created_at': post.created_at
-        })
-    
-    # Convert products to dictionaries for AI analysis
-    products_data = []
-    for product in user_products:
-        products_data.append({
-            'title': product.title,
-            'description': product.description,
-            'price': product.price,
-            'img_url': product.img_url,
-            'created_at': product.created_at
-        })
-    
-    # Generate the portfolio narrative
-    portfolio_narrative = generate_enhanced_portfolio_narrative(
-        artist_name=user.name,
-        posts=posts_data,
-        products=products_data,
-        user_location=user.location
-    )
-    
+    user_posts = db.session.execute(
+        db.select(Posts).options(selectinload(Posts.artist)).where(Posts.artist_id == user_id)).scalars().all()
+    user_products = db.session.execute(
+        db.select(Product).options(selectinload(Product.artist)).where(Product.artist_id == user_id)).scalars().all()
+
+    portfolio_narrative, narrative_job_id = portfolio_narrative_for_view(user, user_posts, user_products)
+
     return render_template("profile.html", 
                          current_user=current_user, 
                          profile_user=user,
                          posts=user_posts, 
                          products=user_products,
-                         portfolio_narrative=portfolio_narrative)
+                         portfolio_narrative=portfolio_narrative,
+                         narrative_job_id=narrative_job_id)
 
 
 @app.route("/product/<int:product_id>")
+@dbrouting.read_only
 def product_buy(product_id):
     product = db.get_or_404(Product, product_id)
     return render_template("product_buy.html", 
@@ -525,12 +1287,89 @@ def product_buy(product_id):
                          product=product)
 
 
+# Admin commands: flask --app app narratives warm|invalidate
+narratives_cli = AppGroup('narratives', help='Pre-warm or invalidate stored portfolio narratives.')
+
+
+@narratives_cli.command('warm')
+@click.option('--artist-id', type=int, multiple=True, help='Limit to these artists (repeatable).')
+@click.option('--force', is_flag=True, help='Regenerate even if the stored narrative is current.')
+def warm_narratives(artist_id, force):
+    """Generate narratives for artists whose stored copy is missing or stale."""
+    users_query = db.select(User)
+    if artist_id:
+        users_query = users_query.where(User.id.in_(artist_id))
+    users = db.session.execute(users_query).scalars().all()
+    for user in users:
+        user_posts = db.session.execute(db.select(Posts).where(Posts.artist_id == user.id)).scalars().all()
+        user_products = db.session.execute(db.select(Product).where(Product.artist_id == user.id)).scalars().all()
+        get_portfolio_narrative(user, user_posts, user_products, force=force)
+        click.echo(f"Warmed narrative for artist {user.id}")
+
+
+@narratives_cli.command('invalidate')
+@click.option('--artist-id', type=int, multiple=True, help='Limit to these artists (repeatable).')
+def invalidate_narratives(artist_id):
+    """Drop stored narratives so they regenerate on the next profile view."""
+    delete_query = db.delete(PortfolioNarrative)
+    if artist_id:
+        delete_query = delete_query.where(PortfolioNarrative.artist_id.in_(artist_id))
+    result = db.session.execute(delete_query)
+    db.session.commit()
+    click.echo(f"Invalidated {result.rowcount} narrative(s)")
+
+
+app.cli.add_command(narratives_cli)
+
+
+# Admin commands: flask --app app media ingest|backfill
+media_cli = AppGroup('media', help='Manage listing images.')
+
+
+@media_cli.command('ingest')
+def ingest_media():
+    """Queue ingestion of listing images still served from remote URLs."""
+    queued = 0
+    for kind, (model, prefix) in LISTING_IMAGES.items():
+        url_attr = f'{prefix}_url'
+        pk = model.__mapper__.primary_key[0]
+        rows = db.session.execute(
+            db.select(pk, getattr(model, url_attr))
+            .where(db.or_(getattr(model, url_attr).like('http://%'), getattr(model, url_attr).like('https://%')))
+        ).all()
+        for listing_id, url in rows:
+            if blobs.digest_for(url) is None:
+                queue_image_job(kind, listing_id, url)
+                queued += 1
+    click.echo(f"Queued {queued} image(s) for ingestion")
+
+
+@media_cli.command('backfill')
+def backfill_media():
+    """Queue variants, size and placeholder for stored images that lack them."""
+    queued = 0
+    for kind, (model, prefix) in LISTING_IMAGES.items():
+        pk = model.__mapper__.primary_key[0]
+        rows = db.session.execute(
+            db.select(pk, getattr(model, f'{prefix}_url'))
+            .where(getattr(model, f'{prefix}_placeholder').is_(None))
+        ).all()
+        for listing_id, url in rows:
+            if blobs.digest_for(url) is not None:
+                job_queue.enqueue('thumbnails', {'kind': kind, 'id': listing_id})
+                queued += 1
+    click.echo(f"Queued {queued} image(s) for processing")
+
+
+app.cli.add_command(media_cli)
+
+
 if __name__ == "__main__":
     try:
-        # Create database tables
+        # Bring the schema up to date (deploys run "flask --app app db upgrade" instead)
         with app.app_context():
-            db.create_all()
-            print("✅ Database tables created successfully")
+            migrate_upgrade()
+            print("✅ Database migrations applied successfully")
         
         # Run the app
         port = int(os.getenv('PORT', 5000))
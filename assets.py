@@ -0,0 +1,97 @@
+"""
+Fingerprinted static assets.
+
+Files under static/css and static/js are hashed at startup, and
+`url_for('static', filename='css/styles.css')` resolves to
+`/static/css/styles.<hash>.css` through a manifest lookup. Fingerprinted URLs
+(and uploads, whose names are never reused) are served with a one-year
+immutable Cache-Control, so repeat visits make no static requests until a
+file's content changes.
+"""
+import hashlib
+import os
+import posixpath
+import re
+from typing import Dict, Optional, Tuple
+
+from flask import abort, current_app, send_from_directory
+
+ONE_YEAR = 365 * 24 * 3600
+HASH_LENGTH = 10
+
+_fingerprint_re = re.compile(r"^(?P<stem>.+)\.[0-9a-f]{%d}(?P<ext>\.[A-Za-z0-9]+)$" % HASH_LENGTH)
+
+
+class Assets:
+    def __init__(self, app=None, directories: Tuple[str, ...] = ('css', 'js'),
+                 immutable_prefixes: Tuple[str, ...] = ('uploads/',)):
+        self.directories = directories
+        self.immutable_prefixes = immutable_prefixes
+        self.static_folder = None
+        # 'css/styles.css' -> 'css/styles.<hash>.css', and the reverse
+        self._manifest: Dict[str, str] = {}
+        self._sources: Dict[str, str] = {}
+        self._mtimes: Dict[str, float] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.static_folder = app.static_folder
+        self.build()
+        app.url_defaults(self._url_defaults)
+        app.view_functions['static'] = self.send_static
+
+    def _fingerprint(self, filename: str) -> str:
+        path = os.path.join(self.static_folder, *filename.split('/'))
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+        self._mtimes[filename] = os.path.getmtime(path)
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}.{digest}{ext}"
+
+    def build(self) -> None:
+        """
+        Hash every asset and rebuild the manifest.
+        """
+        manifest = {}
+        for directory in self.directories:
+            root = os.path.join(self.static_folder, directory)
+            for dirpath, _, names in os.walk(root):
+                for name in names:
+                    filename = os.path.relpath(os.path.join(dirpath, name), self.static_folder).replace(os.sep, '/')
+                    manifest[filename] = self._fingerprint(filename)
+        self._manifest = manifest
+        self._sources = {hashed: source for source, hashed in manifest.items()}
+
+    def lookup(self, filename: str) -> Optional[str]:
+        hashed = self._manifest.get(filename)
+        if hashed is not None and current_app.debug:
+            # Pick up edits while developing without a restart
+            path = os.path.join(self.static_folder, *filename.split('/'))
+            if os.path.exists(path) and os.path.getmtime(path) != self._mtimes.get(filename):
+                hashed = self._fingerprint(filename)
+                self._manifest[filename] = hashed
+                self._sources[hashed] = filename
+        return hashed
+
+    def _url_defaults(self, endpoint, values) -> None:
+        if endpoint == 'static' and 'filename' in values:
+            hashed = self.lookup(values['filename'])
+            if hashed is not None:
+                values['filename'] = hashed
+
+    def send_static(self, filename):
+        # Judge the path that is actually served: 'uploads/../css/x.css' is not an upload
+        filename = posixpath.normpath(filename)
+        if filename == '..' or filename.startswith(('../', '/')):
+            abort(404)
+        source = self._sources.get(filename)
+        if source is not None or filename.startswith(self.immutable_prefixes):
+            response = send_from_directory(self.static_folder, source or filename, max_age=ONE_YEAR)
+            response.cache_control.immutable = True
+            return response
+        match = _fingerprint_re.match(filename)
+        if match and match.group('stem') + match.group('ext') in self._manifest:
+            # A fingerprint from an earlier deploy: serve the current file, but not immutably
+            filename = match.group('stem') + match.group('ext')
+        return current_app.send_static_file(filename)
@@ -0,0 +1,207 @@
+"""
+Content-addressed storage for uploaded images.
+
+Uploads are hashed while they stream to a temporary file, then stored under
+`<aa>/<bb>/<sha256>.<ext>` in the configured storage backend (see storage.py)
+so no directory grows without bound. The same image uploaded twice is stored
+once: the `blobs` table keeps one row per file with a reference count,
+listings take and release references, and `collect()` deletes files (and their
+resized variants) once nothing refers to them.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    def __init__(self, storage, tmp_dir: str):
+        self.storage = storage
+        # Local scratch space for hashing uploads before they are stored
+        self.tmp_dir = tmp_dir
+        self.db = None
+        self.model = None
+
+    def init_app(self, db, model) -> None:
+        self.db = db
+        self.model = model
+
+    def _relative_path(self, digest: str, ext: str) -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+    def _existing_path(self, digest: str, ext: str) -> str:
+        existing = self.db.session.get(self.model, digest)
+        return existing.path if existing is not None else self._relative_path(digest, ext)
+
+    def write(self, stream) -> Tuple[str, str, int]:
+        """
+        Stream into a temporary file while hashing; returns (sha256, temp path, size).
+        The caller stores or removes the temp file.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return sha.hexdigest(), tmp_path, size
+
+    def save(self, stream, ext: str) -> str:
+        """
+        Store an upload and take a reference to it in the current transaction; returns its
+        URL. An identical file already stored is kept and the new copy discarded.
+        """
+        digest, tmp_path, size = self.write(stream)
+        try:
+            relative = self._existing_path(digest, ext)
+            # Reference first: until this transaction ends, collect() cannot delete the
+            # row, and a row it already deleted gets its file stored again below
+            self.acquire(digest, relative, size)
+            if not self.storage.exists(relative):
+                self.storage.put_file(tmp_path, relative)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self.storage.url(relative)
+
+    def adopt(self, key: str, ext: str) -> str:
+        """
+        Copy an object the browser uploaded directly (at `key`) to its content address,
+        taking a reference in the current transaction; returns its URL. Delete `key`
+        once that transaction has committed.
+        """
+        sha = hashlib.sha256()
+        size = 0
+        body = self.storage.open(key)
+        try:
+            while True:
+                chunk = body.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                size += len(chunk)
+        finally:
+            body.close()
+        digest = sha.hexdigest()
+        relative = self._existing_path(digest, ext)
+        # Reference before the existence check, as in save()
+        self.acquire(digest, relative, size)
+        if not self.storage.exists(relative):
+            self.storage.copy(key, relative)
+        return self.storage.url(relative)
+
+    def acquire(self, digest: str, relative: str, size: int) -> None:
+        session = self.db.session
+        model = self.model
+        bumped = session.execute(
+            update(model).where(model.sha256 == digest).values(refcount=model.refcount + 1)
+        ).rowcount
+        if bumped:
+            return
+        try:
+            with session.begin_nested():
+                session.add(model(sha256=digest, path=relative, size=size, refcount=1,
+                                  created_at=datetime.utcnow()))
+        except IntegrityError:
+            # Another upload of the same file inserted the row first
+            session.execute(
+                update(model).where(model.sha256 == digest).values(refcount=model.refcount + 1)
+            )
+
+    def key_for(self, url: Optional[str]) -> Optional[str]:
+        """
+        Storage key for a URL this store handed out, or None.
+        """
+        base = self.storage.url('')
+        if not url or not url.startswith(base):
+            return None
+        return url[len(base):]
+
+    def read(self, url: Optional[str]) -> Optional[bytes]:
+        """
+        Contents of a managed blob, read through the storage backend rather than its public URL.
+        """
+        if self.digest_for(url) is None:
+            return None
+        body = self.storage.open(self.key_for(url))
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def digest_for(self, url: Optional[str]) -> Optional[str]:
+        key = self.key_for(url)
+        if key is None:
+            return None
+        name = key.rsplit('/', 1)[-1].split('.', 1)[0]
+        return name if len(name) == 64 else None
+
+    def sibling_key(self, url: Optional[str], name: str) -> Optional[str]:
+        """
+        Key for a derived file (e.g. a resized variant) stored beside a managed blob.
+        """
+        key = self.key_for(url)
+        if key is None or self.digest_for(url) is None:
+            return None
+        return f"{key.rsplit('/', 1)[0]}/{name}"
+
+    def release(self, url: Optional[str]) -> bool:
+        """
+        Drop a reference in the current transaction. Returns False for URLs this store
+        does not manage (remote images, uploads from before content addressing).
+        """
+        digest = self.digest_for(url)
+        if digest is None:
+            return False
+        model = self.model
+        return bool(self.db.session.execute(
+            update(model).where(model.sha256 == digest, model.refcount > 0)
+            .values(refcount=model.refcount - 1)
+        ).rowcount)
+
+    def collect(self) -> List[str]:
+        """
+        Delete unreferenced blobs and their files; call after the releasing commit.
+        Returns the removed keys.
+        """
+        session = self.db.session
+        model = self.model
+        removed = []
+        for digest, relative in session.execute(
+            select(model.sha256, model.path).where(model.refcount <= 0)
+        ).all():
+            # Conditional delete: a concurrent upload may have re-referenced it
+            gone = session.execute(
+                delete(model).where(model.sha256 == digest, model.refcount <= 0)
+            ).rowcount
+            if not gone:
+                session.commit()
+                continue
+            try:
+                # Files go before the commit: the uncommitted delete makes a concurrent
+                # acquire() wait, and then store the file again under a fresh row
+                self.storage.delete(relative)
+                # The original plus any resized variants stored beside it
+                self.storage.delete_prefix(f"{relative.rsplit('/', 1)[0]}/{digest}_")
+            except Exception:
+                session.rollback()
+                raise
+            session.commit()
+            removed.append(relative)
+        return removed
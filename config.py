@@ -5,6 +5,16 @@ import os
 # Google Gemini API Key - Use environment variable for security
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'your_gemini_api_key_here')
 
+# Gemini model per AI feature - override to use a cheaper/faster model for an endpoint
+GEMINI_MODEL_COPY = os.getenv('GEMINI_MODEL_COPY', 'gemini-2.5-pro')
+GEMINI_MODEL_TRANSLATE = os.getenv('GEMINI_MODEL_TRANSLATE', 'gemini-2.5-pro')
+GEMINI_MODEL_NARRATIVE = os.getenv('GEMINI_MODEL_NARRATIVE', 'gemini-2.5-pro')
+
+# Artwork sent to Gemini is downscaled to this longest edge and re-encoded (JPEG or WEBP)
+AI_IMAGE_MAX_EDGE = int(os.getenv('AI_IMAGE_MAX_EDGE', '1024'))
+AI_IMAGE_FORMAT = os.getenv('AI_IMAGE_FORMAT', 'JPEG').upper()
+AI_IMAGE_QUALITY = int(os.getenv('AI_IMAGE_QUALITY', '85'))
+
 # Flask Secret Key - Use environment variable for security
 FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
 
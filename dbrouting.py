@@ -0,0 +1,84 @@
+"""
+Read-replica routing.
+
+When DATABASE_REPLICA_URL is set it becomes the 'replica' bind, and SELECTs run
+by views marked `@read_only` go to it; everything else (writes, views that are
+not marked, job workers, CLI commands) uses the primary. Once a request writes,
+its remaining queries use the primary too, and the client is pinned to the
+primary for REPLICA_STICKY_SECONDS so it reads its own writes while the replica
+catches up. A read-only view that reads rows it may then write (a get-or-enqueue,
+say) wraps that part in `with primary():`.
+
+Locally, point DATABASE_REPLICA_URL at a second SQLite file (a copy of the
+primary) or a second Postgres instance.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import CompoundSelect, Delete, Insert, Select, Update
+
+REPLICA_BIND = 'replica'
+# Session cookie key holding the time until which this client reads from the primary
+STICKY_KEY = 'db_primary_until'
+
+
+def read_only(f):
+    """
+    Let a view's SELECTs go to the read replica.
+    """
+    f.read_only = True
+    return f
+
+
+@contextmanager
+def primary():
+    """
+    Send the block's SELECTs to the primary, without pinning the client to it.
+    """
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('db_primary', False)
+    g.db_primary = True
+    try:
+        yield
+    finally:
+        g.db_primary = previous
+
+
+def replica_bind(uri, options=None):
+    """
+    SQLALCHEMY_BINDS entry for a replica URL, with the engine options to use for it.
+    """
+    return dict(options or {}, url=uri.replace('postgres://', 'postgresql://'))
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+                g.db_wrote = True
+            elif isinstance(clause, (Select, CompoundSelect)) and self._use_replica():
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self) -> bool:
+        if REPLICA_BIND not in self._db.engines or g.get('db_wrote') or g.get('db_primary'):
+            return False
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, 'read_only', False):
+            return False
+        return session.get(STICKY_KEY, 0) <= time.time()
+
+
+def init_app(app, db) -> None:
+    sticky_seconds = float(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+    @app.after_request
+    def pin_to_primary(response):
+        if g.get('db_wrote') and REPLICA_BIND in db.engines:
+            session[STICKY_KEY] = time.time() + sticky_seconds
+        return response
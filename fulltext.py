@@ -0,0 +1,120 @@
+"""
+Full-text search index for posts and products.
+
+SQLite (development) keeps an FTS5 virtual table per listing type, keyed by the
+listing's primary key as rowid. PostgreSQL (production) keeps a side table with
+a tsvector document per listing and a GIN index over it. Both are kept in sync
+explicitly by the add/delete routes. The index tables are created and
+backfilled by a migration (migrations/versions/d227469ab5a6_...); they have no
+models, so env.py keeps autogenerate from proposing to drop them.
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import literal_column, select, text
+
+# Per listing type: source table, primary key, searchable columns and index table names
+_SPECS: Dict[str, Dict[str, Any]] = {
+    'posts': {
+        'table': 'posts',
+        'pk': 'post_id',
+        'title': 'post_title',
+        'fts_table': 'posts_fts',
+        'pg_table': 'posts_search',
+    },
+    'products': {
+        'table': 'products',
+        'pk': 'product_id',
+        'title': 'title',
+        'fts_table': 'products_fts',
+        'pg_table': 'products_search',
+    },
+}
+
+
+def is_index_table(name: str) -> bool:
+    """
+    Whether a table belongs to the search index, including FTS5's shadow tables
+    (posts_fts_data, posts_fts_idx, ...).
+    """
+    for spec in _SPECS.values():
+        if name == spec['pg_table'] or name == spec['fts_table'] or name.startswith(spec['fts_table'] + '_'):
+            return True
+    return False
+
+
+def _dialect(session) -> str:
+    return session.get_bind().dialect.name
+
+
+def _pg_document_sql(title: str, description: str, artist: str) -> str:
+    # Title weighs more than artist name, which weighs more than the description
+    return (
+        f"setweight(to_tsvector('simple', coalesce({title}, '')), 'A') || "
+        f"setweight(to_tsvector('simple', coalesce({artist}, '')), 'B') || "
+        f"setweight(to_tsvector('simple', coalesce({description}, '')), 'C')"
+    )
+
+
+def index_listing(session, kind: str, listing_id: int, title: Optional[str],
+                  description: Optional[str], artist_name: Optional[str]) -> None:
+    """
+    Insert or replace one listing in the index. Runs inside the caller's transaction.
+    """
+    spec = _SPECS[kind]
+    params = {
+        'id': listing_id,
+        'title': title or '',
+        'description': description or '',
+        'artist': artist_name or '',
+    }
+    if _dialect(session) == 'postgresql':
+        document = _pg_document_sql(':title', ':description', ':artist')
+        session.execute(text(
+            f"INSERT INTO {spec['pg_table']} ({spec['pk']}, document) VALUES (:id, {document}) "
+            f"ON CONFLICT ({spec['pk']}) DO UPDATE SET document = EXCLUDED.document"
+        ), params)
+    else:
+        session.execute(text(f"DELETE FROM {spec['fts_table']} WHERE rowid = :id"), {'id': listing_id})
+        session.execute(text(
+            f"INSERT INTO {spec['fts_table']} (rowid, title, description, artist) "
+            f"VALUES (:id, :title, :description, :artist)"
+        ), params)
+
+
+def remove_listing(session, kind: str, listing_id: int) -> None:
+    """
+    Drop one listing from the index. Runs inside the caller's transaction.
+    """
+    spec = _SPECS[kind]
+    if _dialect(session) == 'postgresql':
+        session.execute(text(f"DELETE FROM {spec['pg_table']} WHERE {spec['pk']} = :id"), {'id': listing_id})
+    else:
+        session.execute(text(f"DELETE FROM {spec['fts_table']} WHERE rowid = :id"), {'id': listing_id})
+
+
+def match_clause(session, kind: str, pk_column, keywords: List[str]):
+    """
+    Build a `pk_column IN (<index lookup>)` clause matching listings that contain
+    every keyword as a word prefix. Returns None when there is nothing to match.
+    """
+    # parse_search_query already yields [a-z0-9] tokens; strip anything else defensively
+    terms = [''.join(ch for ch in kw if ch.isalnum()) for kw in keywords]
+    terms = [t for t in terms if t]
+    if not terms:
+        return None
+    spec = _SPECS[kind]
+    if _dialect(session) == 'postgresql':
+        query = ' & '.join(f"{t}:*" for t in terms)
+        lookup = (
+            select(literal_column(spec['pk']))
+            .select_from(text(spec['pg_table']))
+            .where(text("document @@ to_tsquery('simple', :fts_query)").bindparams(fts_query=query))
+        )
+    else:
+        query = ' AND '.join(f'"{t}"*' for t in terms)
+        lookup = (
+            select(literal_column('rowid'))
+            .select_from(text(spec['fts_table']))
+            .where(text(f"{spec['fts_table']} MATCH :fts_query").bindparams(fts_query=query))
+        )
+    return pk_column.in_(lookup)
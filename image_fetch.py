@@ -0,0 +1,259 @@
+"""
+Bounded image fetcher for AI image-by-URL requests.
+
+Remote images are streamed through a pooled requests.Session with a hard byte
+cap and an early abort when the server does not claim to send an image. URLs
+under our own /static/uploads/ are read straight from disk. Fetched bytes are
+cached by content hash, and URLs map to hashes for a short time, so repeated
+suggestion clicks on the same image do not download it again.
+
+Only hosts that resolve to public addresses are fetched: private, loopback,
+link-local (cloud metadata at 169.254.169.254), reserved and multicast addresses
+are refused. The check runs where the connection is opened, and the socket goes
+to the address that passed it, so a host cannot resolve to a public address for
+the check and an internal one for the connection. Redirects are followed by hand
+so every hop is checked the same way.
+"""
+import hashlib
+import ipaddress
+import mimetypes
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+UPLOADS_PREFIX = '/static/uploads/'
+MAX_REDIRECTS = 5
+
+
+def _public_ip(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if getattr(ip, 'ipv4_mapped', None):
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _public_address(host: str, port: int) -> Optional[str]:
+    """
+    An address to connect to for host, or None unless every address it resolves to is public.
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError, UnicodeError):
+        return None
+    if not infos or not all(_public_ip(info[4][0]) for info in infos):
+        return None
+    return infos[0][4][0]
+
+
+def is_public_url(url: str) -> bool:
+    """
+    Whether url is http(s) and every address its host resolves to is public.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError:
+        return False
+    return _public_address(parsed.hostname, port) is not None
+
+
+class _PublicOnlyConnection:
+    """
+    Resolve and check the host when the socket is opened, then connect to that
+    address; TLS still verifies the certificate against the host name.
+    """
+
+    def _new_conn(self):
+        host = self._dns_host
+        address = _public_address(host, self.port)
+        if address is None:
+            raise NewConnectionError(self, f"Refusing to connect to {host}: not a public address")
+        self._dns_host = address
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+
+
+class _PublicHTTPConnection(_PublicOnlyConnection, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicOnlyConnection, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class PublicOnlyAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections only ever reach public addresses.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PublicHTTPConnectionPool,
+            'https': _PublicHTTPSConnectionPool,
+        }
+
+
+class ImageFetcher:
+    def __init__(self, static_root: str = STATIC_ROOT, max_bytes: int = 10 * 1024 * 1024,
+                 timeout: Tuple[float, float] = (3.05, 10.0), cache_bytes: int = 64 * 1024 * 1024,
+                 url_ttl: float = 600.0, pool_size: int = 16):
+        self.static_root = os.path.abspath(static_root)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.cache_bytes = cache_bytes
+        self.url_ttl = url_ttl
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        # content hash -> (bytes, mime type), LRU bounded by total size
+        self._blobs: 'OrderedDict[str, Tuple[bytes, str]]' = OrderedDict()
+        self._blob_total = 0
+        # url -> (content hash, expiry)
+        self._urls: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+
+    def _get_session(self) -> requests.Session:
+        # One pooled session per process; a forked child builds its own
+        if self._session is None or self._pid != os.getpid():
+            session = requests.Session()
+            # Proxies from the environment would connect on our behalf, past the address check
+            session.trust_env = False
+            adapter = PublicOnlyAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'Clyst-ImageFetcher/1.0'
+            session.headers['Accept'] = 'image/*'
+            self._session = session
+            self._pid = os.getpid()
+        return self._session
+
+    def _remember(self, url: str, data: bytes, mime_type: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest not in self._blobs:
+                self._blobs[digest] = (data, mime_type)
+                self._blob_total += len(data)
+                while self._blob_total > self.cache_bytes and len(self._blobs) > 1:
+                    _, (old, _) = self._blobs.popitem(last=False)
+                    self._blob_total -= len(old)
+            self._blobs.move_to_end(digest)
+            self._urls[url] = (digest, time.monotonic() + self.url_ttl)
+            self._urls.move_to_end(url)
+            while len(self._urls) > 4096:
+                self._urls.popitem(last=False)
+        return digest
+
+    def _cached(self, url: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._urls.get(url)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            blob = self._blobs.get(entry[0])
+            if blob is not None:
+                self._blobs.move_to_end(entry[0])
+            return blob
+
+    def local_path(self, url: str) -> Optional[str]:
+        """
+        Filesystem path for one of our own /static/uploads/ URLs, or None.
+        """
+        parsed = urlparse(url)
+        if parsed.netloc or not parsed.path.startswith(UPLOADS_PREFIX):
+            return None
+        relative = parsed.path[len('/static/'):]
+        path = os.path.abspath(os.path.join(self.static_root, *relative.split('/')))
+        # Refuse anything that escapes the static directory
+        if not path.startswith(self.static_root + os.sep):
+            return None
+        return path
+
+    def fetch(self, url: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Return (bytes, mime type) for an image URL, or None if it cannot be fetched,
+        is not an image, or exceeds max_bytes.
+        """
+        url = (url or '').strip()
+        if not url:
+            return None
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+
+        path = self.local_path(url)
+        if path is not None:
+            try:
+                if os.path.getsize(path) > self.max_bytes:
+                    return None
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return None
+            mime_type = mimetypes.guess_type(path)[0] or 'image/jpeg'
+            self._remember(url, data, mime_type)
+            return data, mime_type
+
+        target = url
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                # The adapter checks the address of every connection it opens
+                if urlparse(target).scheme not in ('http', 'https'):
+                    return None
+                resp = self._get_session().get(target, stream=True, timeout=self.timeout, allow_redirects=False)
+                if not resp.is_redirect:
+                    break
+                target = urljoin(target, resp.headers['Location'])
+                resp.close()
+            else:
+                return None
+            with resp:
+                resp.raise_for_status()
+                content_type = (resp.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+                # Abort before downloading anything that is clearly not an image
+                if content_type and not content_type.startswith('image/'):
+                    return None
+                declared = resp.headers.get('Content-Length')
+                if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                    return None
+                buf = bytearray()
+                for chunk in resp.iter_content(chunk_size=64 * 1024):
+                    buf += chunk
+                    if len(buf) > self.max_bytes:
+                        return None
+        except requests.RequestException:
+            return None
+        mime_type = content_type or mimetypes.guess_type(urlparse(target).path)[0] or 'image/jpeg'
+        data = bytes(buf)
+        self._remember(url, data, mime_type)
+        return data, mime_type
+
+
+# Matches the 16MB upload limit so stored uploads can always be read back
+fetcher = ImageFetcher(max_bytes=int(os.getenv('AI_IMAGE_MAX_BYTES', 16 * 1024 * 1024)))
+
+
+def fetch_image(url: str) -> Optional[Tuple[bytes, str]]:
+    return fetcher.fetch(url)
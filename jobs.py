@@ -0,0 +1,260 @@
+"""
+Database-backed background job queue.
+
+Jobs are rows in the application's own database, so no outside broker is needed.
+Every process runs a small pool of worker threads that claim due jobs with a
+conditional UPDATE, run the registered handler inside an app context and store
+the JSON result. Failed jobs are retried with exponential backoff, and each job
+type has a cap on how many of its jobs may run at the same time.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import func, or_, select, update
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    def __init__(self, workers: int = 2, poll_interval: float = 1.0,
+                 lease_timeout: float = 300.0, retention: float = 86400.0,
+                 sweep_interval: float = 60.0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        # A job still 'running' after this many seconds is assumed orphaned and requeued,
+        # or failed if it has used up its attempts; checked every sweep_interval seconds
+        self.lease_timeout = lease_timeout
+        self.sweep_interval = sweep_interval
+        # Finished jobs older than this many seconds are pruned
+        self.retention = retention
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._last_prune = 0.0
+        self._last_sweep = 0.0
+        self.app = None
+        self.db = None
+        self.model = None
+
+    def init_app(self, app, db, model) -> None:
+        self.app = app
+        self.db = db
+        self.model = model
+
+    def task(self, kind: str, concurrency: int = 2, max_attempts: int = 3, retry_delay: float = 2.0):
+        """
+        Register a handler for a job type. The handler receives the decoded payload and
+        returns a JSON-serialisable result; raising schedules a retry.
+        """
+        def decorator(fn: Callable[[Dict[str, Any]], Any]):
+            self._tasks[kind] = {
+                'fn': fn,
+                'max_attempts': max_attempts,
+                'retry_delay': retry_delay,
+                'semaphore': threading.BoundedSemaphore(concurrency),
+                'concurrency': concurrency,
+            }
+            return fn
+        return decorator
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], owner_id: Optional[int] = None,
+                dedupe_key: Optional[str] = None, reuse_for: float = 0.0):
+        """
+        Queue a job and return its row. With `dedupe_key`, an unfinished job with the
+        same key is returned instead of queueing a duplicate, as is (with `reuse_for`)
+        one that finished less than that many seconds ago.
+        """
+        if kind not in self._tasks:
+            raise ValueError(f"Unknown job type: {kind}")
+        session = self.db.session
+        if dedupe_key:
+            current = self.model.status.in_([QUEUED, RUNNING])
+            if reuse_for:
+                current = or_(current, self.model.finished_at >= datetime.utcnow() - timedelta(seconds=reuse_for))
+            existing = session.execute(
+                select(self.model)
+                .where(self.model.dedupe_key == dedupe_key, current)
+                .order_by(self.model.id.desc())
+                .limit(1)
+            ).scalar()
+            if existing is not None:
+                return existing
+        now = datetime.utcnow()
+        job = self.model(
+            kind=kind,
+            status=QUEUED,
+            payload=json.dumps(payload),
+            owner_id=owner_id,
+            dedupe_key=dedupe_key,
+            attempts=0,
+            max_attempts=self._tasks[kind]['max_attempts'],
+            run_after=now,
+            created_at=now,
+        )
+        session.add(job)
+        session.commit()
+        # Workers are started by the serving process (see start()), not by CLI commands
+        # that enqueue and exit; wake them if they run here
+        self._wake.set()
+        return job
+
+    def describe(self, job) -> Dict[str, Any]:
+        result = None
+        if job.result:
+            try:
+                result = json.loads(job.result)
+            except Exception:
+                result = None
+        return {
+            'ok': True,
+            'job_id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'attempts': job.attempts,
+            'result': result,
+            'error': job.error if job.status == FAILED else None,
+        }
+
+    def start(self) -> None:
+        """
+        Start this process's worker threads. Safe to call repeatedly, and restarts
+        the pool in a forked child where the parent's threads do not exist.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+
+    def _work(self) -> None:
+        last_error = None
+        while True:
+            claimed = None
+            try:
+                with self.app.app_context():
+                    claimed = self._claim()
+                    if claimed is not None:
+                        self._run(*claimed)
+                    self._maybe_sweep()
+                    self._maybe_prune()
+                last_error = None
+            except Exception as e:
+                # Report each distinct failure once (e.g. tables missing before first deploy)
+                if str(e) != last_error:
+                    print(f"Job worker error: {e}")
+                    last_error = str(e)
+            if claimed is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self):
+        model = self.model
+        session = self.db.session
+        now = datetime.utcnow()
+        running = dict(session.execute(
+            select(model.kind, func.count()).where(model.status == RUNNING).group_by(model.kind)
+        ).all())
+        for kind, spec in self._tasks.items():
+            # Cap is enforced both across processes (running rows) and within this one
+            if running.get(kind, 0) >= spec['concurrency']:
+                continue
+            if not spec['semaphore'].acquire(blocking=False):
+                continue
+            claimed = False
+            try:
+                job_id = session.execute(
+                    select(model.id)
+                    .where(model.status == QUEUED, model.kind == kind, model.run_after <= now)
+                    .order_by(model.run_after, model.id)
+                    .limit(1)
+                ).scalar()
+                updated = 0
+                if job_id is not None:
+                    updated = session.execute(
+                        update(model)
+                        .where(model.id == job_id, model.status == QUEUED)
+                        .values(status=RUNNING, locked_at=now, attempts=model.attempts + 1)
+                    ).rowcount
+                session.commit()
+                claimed = bool(updated)
+            finally:
+                # Keep the permit only for a job we now own; _run releases it
+                if not claimed:
+                    spec['semaphore'].release()
+            if claimed:
+                return job_id, spec
+        return None
+
+    def _run(self, job_id: int, spec: Dict[str, Any]) -> None:
+        session = self.db.session
+        try:
+            job = session.get(self.model, job_id)
+            try:
+                result = spec['fn'](json.loads(job.payload or '{}'))
+                job.status = DONE
+                job.result = json.dumps(result, default=str)
+                job.error = None
+                job.finished_at = datetime.utcnow()
+            except Exception as e:
+                session.rollback()
+                job = session.get(self.model, job_id)
+                job.error = str(e)
+                if job.attempts < job.max_attempts:
+                    # Exponential backoff: retry_delay, 2x, 4x, ...
+                    delay = spec['retry_delay'] * (2 ** (job.attempts - 1))
+                    job.status = QUEUED
+                    job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+                else:
+                    job.status = FAILED
+                    job.finished_at = datetime.utcnow()
+            session.commit()
+        finally:
+            spec['semaphore'].release()
+
+    def _maybe_sweep(self) -> None:
+        # Recover jobs whose worker died mid-run; not on every poll, to keep idle
+        # workers from writing to the database
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        model = self.model
+        session = self.db.session
+        utcnow = datetime.utcnow()
+        expired = (model.status == RUNNING, model.locked_at < utcnow - timedelta(seconds=self.lease_timeout))
+        # A job that keeps killing its worker must not loop forever
+        session.execute(
+            update(model)
+            .where(*expired, model.attempts >= model.max_attempts)
+            .values(status=FAILED, error='Worker stopped while running the job', finished_at=utcnow)
+        )
+        session.execute(
+            update(model)
+            .where(*expired, model.attempts < model.max_attempts)
+            .values(status=QUEUED, run_after=utcnow)
+        )
+        session.commit()
+
+    def _maybe_prune(self) -> None:
+        now = time.monotonic()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        session = self.db.session
+        session.execute(
+            self.model.__table__.delete()
+            .where(self.model.status.in_([DONE, FAILED]), self.model.finished_at < cutoff)
+        )
+        session.commit()
@@ -0,0 +1,105 @@
+"""datetime created_at and listing indexes
+
+Revision ID: 02e4ed8aee89
+Revises: 702a3b2f2433
+Create Date: 2026-10-18 10:21:37.904415
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '02e4ed8aee89'
+down_revision = '702a3b2f2433'
+branch_labels = None
+depends_on = None
+
+# Table -> primary key of the tables whose created_at was a "March 05, 2025" string
+DATED_TABLES = {'users': 'id', 'posts': 'post_id', 'products': 'product_id'}
+LEGACY_DATE_FORMAT = "%B %d, %Y"
+
+# Profile pages filter by artist, the product search by price and the feeds page
+# newest first by (created_at, id)
+INDEXES = (
+    ('ix_posts_artist_id', 'posts', ['artist_id']),
+    ('ix_posts_created_at_id', 'posts', ['created_at', 'post_id']),
+    ('ix_products_artist_id', 'products', ['artist_id']),
+    ('ix_products_price', 'products', ['price']),
+    ('ix_products_created_at_id', 'products', ['created_at', 'product_id']),
+)
+
+
+def _parse_created_at(raw):
+    # Unparseable or missing dates become the epoch so every row keeps a place in
+    # the newest-first feeds
+    raw = (raw or '').strip()
+    for parse in (lambda v: datetime.strptime(v, LEGACY_DATE_FORMAT), datetime.fromisoformat):
+        try:
+            return parse(raw)
+        except ValueError:
+            pass
+    return datetime(1970, 1, 1)
+
+
+def _convert_sqlite(bind, inspector, table, pk):
+    # SQLite stores DateTime as ISO text, so only the legacy values need rewriting
+    rows = bind.execute(sa.text(
+        f"SELECT {pk}, created_at FROM {table} "
+        f"WHERE created_at IS NULL OR created_at NOT LIKE '____-__-__%'"
+    )).all()
+    update_date = sa.text(f"UPDATE {table} SET created_at = :value WHERE {pk} = :id").bindparams(
+        sa.bindparam('value', type_=sa.DateTime()))
+    for row_id, raw in rows:
+        bind.execute(update_date, {'value': _parse_created_at(raw), 'id': row_id})
+    column = next(c for c in inspector.get_columns(table) if c['name'] == 'created_at')
+    if not isinstance(column['type'], sa.DateTime):
+        # Recreate the table with the column declared DATETIME. Overriding the reflected
+        # type rather than altering it keeps batch mode from CASTing the values, which
+        # would truncate the ISO strings to their year.
+        with op.batch_alter_table(table, recreate='always',
+                                  reflect_args=[sa.Column('created_at', sa.DateTime())]):
+            pass
+
+
+def _convert_postgresql(bind, inspector, table, pk):
+    column = next(c for c in inspector.get_columns(table) if c['name'] == 'created_at')
+    if isinstance(column['type'], sa.DateTime):
+        return
+    # Parse in Python as on SQLite: to_timestamp() raises on a malformed value, which
+    # would abort the whole upgrade. Every value is rewritten as ISO text first, so
+    # the cast below cannot fail.
+    rows = bind.execute(sa.text(f"SELECT {pk}, created_at FROM {table}")).all()
+    update_date = sa.text(f"UPDATE {table} SET created_at = :value WHERE {pk} = :id")
+    for row_id, raw in rows:
+        value = _parse_created_at(raw).isoformat(sep=' ')
+        if value != raw:
+            bind.execute(update_date, {'value': value, 'id': row_id})
+    op.alter_column(table, 'created_at', type_=sa.DateTime(), existing_nullable=True,
+                    postgresql_using='created_at::timestamp')
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, pk in DATED_TABLES.items():
+        if bind.dialect.name == 'sqlite':
+            _convert_sqlite(bind, inspector, table, pk)
+        else:
+            _convert_postgresql(bind, inspector, table, pk)
+
+    existing = {index['name'] for table in ('posts', 'products') for index in inspector.get_indexes(table)}
+    for name, table, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    for table in DATED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('created_at', type_=sa.String(length=250), existing_nullable=True,
+                                  postgresql_using="to_char(created_at, 'FMMonth DD, YYYY')")
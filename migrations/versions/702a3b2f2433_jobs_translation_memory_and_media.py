@@ -0,0 +1,101 @@
+"""jobs, translation memory, narratives and media tables
+
+Revision ID: 702a3b2f2433
+Revises: aba91d157f50
+Create Date: 2026-10-18 10:14:02.571930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '702a3b2f2433'
+down_revision = 'aba91d157f50'
+branch_labels = None
+depends_on = None
+
+# Columns added to listing tables that already existed
+IMAGE_COLUMNS = {
+    'posts': ('media_variants', 'media_width', 'media_height', 'media_placeholder'),
+    'products': ('img_variants', 'img_width', 'img_height', 'img_placeholder'),
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('portfolio_narratives'):
+        op.create_table('portfolio_narratives',
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('narrative', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['artist_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('artist_id')
+        )
+    if not inspector.has_table('jobs'):
+        op.create_table('jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('dedupe_key', sa.String(length=255), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_after', sa.DateTime(), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_jobs_claim', 'jobs', ['status', 'kind', 'run_after'], unique=False)
+        op.create_index(op.f('ix_jobs_dedupe_key'), 'jobs', ['dedupe_key'], unique=False)
+    if not inspector.has_table('translation_memory'):
+        op.create_table('translation_memory',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('source_lang', sa.String(length=20), nullable=True),
+        sa.Column('target_lang', sa.String(length=20), nullable=True),
+        sa.Column('locale', sa.String(length=20), nullable=True),
+        sa.Column('result', sa.Text(), nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+        )
+    if not inspector.has_table('blobs'):
+        op.create_table('blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+        )
+        op.create_index(op.f('ix_blobs_refcount'), 'blobs', ['refcount'], unique=False)
+
+    for table, (variants, width, height, placeholder) in IMAGE_COLUMNS.items():
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for column in (sa.Column(variants, sa.Text(), nullable=True),
+                       sa.Column(width, sa.Integer(), nullable=True),
+                       sa.Column(height, sa.Integer(), nullable=True),
+                       sa.Column(placeholder, sa.Text(), nullable=True)):
+            if column.name not in existing:
+                op.add_column(table, column)
+
+
+def downgrade():
+    for table, columns in IMAGE_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for name in reversed(columns):
+                batch_op.drop_column(name)
+    op.drop_index(op.f('ix_blobs_refcount'), table_name='blobs')
+    op.drop_table('blobs')
+    op.drop_table('translation_memory')
+    op.drop_index(op.f('ix_jobs_dedupe_key'), table_name='jobs')
+    op.drop_index('ix_jobs_claim', table_name='jobs')
+    op.drop_table('jobs')
+    op.drop_table('portfolio_narratives')
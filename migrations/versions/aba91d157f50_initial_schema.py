@@ -0,0 +1,62 @@
+"""initial schema
+
+Revision ID: aba91d157f50
+Revises: 
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aba91d157f50'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created with db.create_all() before migrations already have these tables
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('users'):
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=True),
+        sa.Column('email', sa.String(length=100), nullable=True),
+        sa.Column('password_hash', sa.String(length=255), nullable=True),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('location', sa.String(length=150), nullable=True),
+        sa.Column('created_at', sa.String(length=250), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+        )
+    if not inspector.has_table('posts'):
+        op.create_table('posts',
+        sa.Column('post_id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('post_title', sa.String(length=255), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('media_url', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['artist_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('post_id')
+        )
+    if not inspector.has_table('products'):
+        op.create_table('products',
+        sa.Column('product_id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=150), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('img_url', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.String(length=250), nullable=True),
+        sa.ForeignKeyConstraint(['artist_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('product_id')
+        )
+
+
+def downgrade():
+    op.drop_table('products')
+    op.drop_table('posts')
+    op.drop_table('users')
@@ -0,0 +1,67 @@
+"""full-text search index
+
+Revision ID: d227469ab5a6
+Revises: 02e4ed8aee89
+Create Date: 2026-10-18 14:02:19.446310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd227469ab5a6'
+down_revision = '02e4ed8aee89'
+branch_labels = None
+depends_on = None
+
+# Listing table -> (primary key, title column, SQLite FTS5 table, PostgreSQL tsvector table)
+SEARCH_TABLES = {
+    'posts': ('post_id', 'post_title', 'posts_fts', 'posts_search'),
+    'products': ('product_id', 'title', 'products_fts', 'products_search'),
+}
+
+
+def upgrade():
+    # Databases that served requests before this revision may already have the
+    # tables (they used to be created on first use); only new ones are backfilled
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, (pk, title, fts_table, pg_table) in SEARCH_TABLES.items():
+        source = f"FROM {table} AS src LEFT JOIN users AS u ON u.id = src.artist_id"
+        if bind.dialect.name == 'postgresql':
+            if inspector.has_table(pg_table):
+                continue
+            op.execute(
+                f"CREATE TABLE {pg_table} ("
+                f"{pk} INTEGER PRIMARY KEY REFERENCES {table} ({pk}) ON DELETE CASCADE, "
+                f"document TSVECTOR NOT NULL)"
+            )
+            op.execute(f"CREATE INDEX {pg_table}_document_idx ON {pg_table} USING GIN (document)")
+            # Title weighs more than artist name, which weighs more than the description
+            op.execute(
+                f"INSERT INTO {pg_table} ({pk}, document) "
+                f"SELECT src.{pk}, "
+                f"setweight(to_tsvector('simple', coalesce(src.{title}, '')), 'A') || "
+                f"setweight(to_tsvector('simple', coalesce(u.name, '')), 'B') || "
+                f"setweight(to_tsvector('simple', coalesce(src.description, '')), 'C') "
+                f"{source}"
+            )
+        else:
+            if inspector.has_table(fts_table):
+                continue
+            op.execute(
+                f"CREATE VIRTUAL TABLE {fts_table} "
+                f"USING fts5(title, description, artist, tokenize = 'unicode61')"
+            )
+            op.execute(
+                f"INSERT INTO {fts_table} (rowid, title, description, artist) "
+                f"SELECT src.{pk}, coalesce(src.{title}, ''), "
+                f"coalesce(src.description, ''), coalesce(u.name, '') {source}"
+            )
+
+
+def downgrade():
+    bind = op.get_bind()
+    for _, _, fts_table, pg_table in SEARCH_TABLES.values():
+        op.execute(f"DROP TABLE IF EXISTS {pg_table if bind.dialect.name == 'postgresql' else fts_table}")
@@ -0,0 +1,98 @@
+"""
+Password hashing off the request thread.
+
+Hashes are computed in a small process pool so a burst of logins or sign-ups
+uses at most PASSWORD_HASH_WORKERS cores per app process instead of every
+worker's, leaving CPU for page rendering. When more than PASSWORD_HASH_QUEUE
+hashes are already waiting, new ones fail fast with HasherBusy rather than
+queueing behind them. The hash method comes from PASSWORD_HASH_METHOD (any
+werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"), and
+stored hashes made with other parameters are upgraded on the next login.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _pool_context():
+    # Workers must not inherit the app's threads and locks, so never plain fork
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class PasswordHasher:
+    def __init__(self, method: str = 'scrypt', workers: int = 2, max_pending: int = 8,
+                 timeout: float = 10.0):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        # "<method>:<params>" prefix that hashes made with the current settings start with
+        self._prefix: Optional[str] = None
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        # One pool per process; a forked child builds its own
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        pool = self._get_pool()
+        if pool is None:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HasherBusy()
+            self._pending += 1
+        try:
+            return pool.submit(fn, *args).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy()
+        except BrokenProcessPool:
+            # A worker died (or could not start); hash here and build a new pool next time
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def hash(self, password: str) -> str:
+        """
+        Hash with the configured method. Raises HasherBusy when the queue is full.
+        """
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash: Optional[str], password: str) -> bool:
+        if not stored_hash:
+            return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash: Optional[str]) -> bool:
+        """
+        Whether a hash that just verified was made with other parameters than PASSWORD_HASH_METHOD.
+        """
+        if not stored_hash:
+            return False
+        if self._prefix is None:
+            # werkzeug fills in default parameters; hash once to learn the full prefix
+            self._prefix = self._run(generate_password_hash, '', self.method).split('$', 1)[0]
+        return stored_hash.split('$', 1)[0] != self._prefix
@@ -0,0 +1,115 @@
+"""
+Per-request SQL query budget.
+
+Every statement a request runs is counted. A request that goes over its budget
+(QUERY_BUDGET, or a view's own `@query_budget(n)`) is logged with its most
+repeated statement, which is usually the lazy load behind an N+1 loop. With
+QUERY_BUDGET_RAISE set (the default when app.testing is on) it raises
+QueryBudgetExceeded instead, so a test that renders a page fails on the
+regression. `expect_queries(n)` asserts a budget around any block of code.
+"""
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import List
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryLog:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def summary(self) -> str:
+        if not self.statements:
+            return 'no queries'
+        statement, times = Counter(self.statements).most_common(1)[0]
+        return f"most repeated ({times}x): {' '.join(statement.split())[:200]}"
+
+
+def query_budget(limit: int):
+    """
+    Override the default budget for one view, e.g. a page that legitimately runs more queries.
+    """
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+class QueryCounter:
+    def __init__(self, app=None, budget: int = 15):
+        self.budget = budget
+        # Logs being recorded on this thread; job workers and other threads are not counted
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('QUERY_BUDGET', self.budget)
+        event.listen(Engine, 'before_cursor_execute', self._record)
+        app.before_request(self._start_request)
+        app.after_request(self._check_request)
+        app.teardown_request(self._end_request)
+
+    def _active(self) -> List[QueryLog]:
+        if not hasattr(self._local, 'logs'):
+            self._local.logs = []
+        return self._local.logs
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        for log in self._active():
+            log.statements.append(statement)
+
+    def _start_request(self):
+        self._local.request_log = QueryLog()
+        self._active().append(self._local.request_log)
+
+    def _check_request(self, response):
+        log = getattr(self._local, 'request_log', None)
+        if log is None:
+            return response
+        app = current_app
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None) or app.config['QUERY_BUDGET']
+        if app.debug:
+            response.headers['X-Query-Count'] = str(log.count)
+        if log.count > budget:
+            message = (f"{request.method} {request.path} ran {log.count} queries "
+                       f"(budget {budget}); {log.summary()}")
+            if app.config.get('QUERY_BUDGET_RAISE', app.testing):
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
+
+    def _end_request(self, exc=None):
+        log = getattr(self._local, 'request_log', None)
+        if log is not None:
+            self._local.request_log = None
+            if log in self._active():
+                self._active().remove(log)
+
+    @contextmanager
+    def expect_queries(self, limit: int):
+        """
+        Fail with QueryBudgetExceeded if the block runs more than `limit` queries, e.g.
+        `with query_counter.expect_queries(5): client.get('/')`.
+        """
+        log = QueryLog()
+        self._active().append(log)
+        try:
+            yield log
+        finally:
+            self._active().remove(log)
+        if log.count > limit:
+            raise QueryBudgetExceeded(f"ran {log.count} queries (budget {limit}); {log.summary()}")
@@ -0,0 +1,288 @@
+"""
+In-process BM25 search over posts and products.
+
+Each listing type gets an inverted index whose posting lists are parallel
+`array` buffers (document slots and term frequencies) rather than dicts of sets,
+so 100k+ listings stay compact and scoring is a tight loop. The index is
+warm-loaded by the first requests a process serves (and retried until it
+succeeds, e.g. while the schema is still being migrated), updated incrementally by the add/delete routes, and
+periodically catches up on listings written by other worker processes.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Field weights: a title hit counts more than an artist hit, which counts more than description
+TITLE_WEIGHT = 3
+ARTIST_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+# A query keyword expands to at most this many indexed terms sharing its prefix
+MAX_PREFIX_EXPANSIONS = 64
+
+_token_re = re.compile(r"[^a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split text into lowercase alphanumeric tokens, matching natural_search keywords.
+    """
+    return [t for t in _token_re.split((text or '').lower()) if len(t) > 2]
+
+
+class InvertedIndex:
+    """
+    BM25 inverted index for one listing type. Not thread-safe on its own;
+    SearchIndex serialises access.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._sorted_terms: Optional[List[str]] = None
+        self._post_slots: List[array] = []
+        self._post_tfs: List[array] = []
+        self._df = array('i')
+        self._doc_ids = array('q')
+        self._doc_lens = array('i')
+        self._alive = bytearray()
+        self._slot_of: Dict[int, int] = {}
+        self._live = 0
+        self._total_len = 0
+        self.max_id = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def add(self, doc_id: int, title: Optional[str], description: Optional[str], artist: Optional[str]) -> None:
+        if doc_id in self._slot_of:
+            self.remove(doc_id)
+        counts: Dict[str, int] = {}
+        for text, weight in ((title, TITLE_WEIGHT), (artist, ARTIST_WEIGHT), (description, DESCRIPTION_WEIGHT)):
+            for tok in tokenize(text):
+                counts[tok] = counts.get(tok, 0) + weight
+        slot = len(self._doc_ids)
+        doc_len = sum(counts.values())
+        self._doc_ids.append(doc_id)
+        self._doc_lens.append(doc_len)
+        self._alive.append(1)
+        self._slot_of[doc_id] = slot
+        self._live += 1
+        self._total_len += doc_len
+        self.max_id = max(self.max_id, doc_id)
+        for tok, tf in counts.items():
+            tid = self._term_ids.get(tok)
+            if tid is None:
+                tid = len(self._terms)
+                self._term_ids[tok] = tid
+                self._terms.append(tok)
+                self._post_slots.append(array('i'))
+                self._post_tfs.append(array('i'))
+                self._df.append(0)
+                self._sorted_terms = None
+            self._post_slots[tid].append(slot)
+            self._post_tfs[tid].append(tf)
+            self._df[tid] += 1
+
+    def remove(self, doc_id: int) -> None:
+        # Tombstone the slot; postings are dropped on the next compaction
+        slot = self._slot_of.pop(doc_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = 0
+        self._live -= 1
+        self._total_len -= self._doc_lens[slot]
+        if len(self._doc_ids) > 1024 and self._live < len(self._doc_ids) // 2:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Rewrite posting lists without tombstoned slots and refresh document frequencies.
+        """
+        remap = array('i', [-1]) * len(self._doc_ids)
+        doc_ids, doc_lens = array('q'), array('i')
+        for slot, alive in enumerate(self._alive):
+            if alive:
+                remap[slot] = len(doc_ids)
+                doc_ids.append(self._doc_ids[slot])
+                doc_lens.append(self._doc_lens[slot])
+        for tid in range(len(self._terms)):
+            slots, tfs = array('i'), array('i')
+            for slot, tf in zip(self._post_slots[tid], self._post_tfs[tid]):
+                new_slot = remap[slot]
+                if new_slot >= 0:
+                    slots.append(new_slot)
+                    tfs.append(tf)
+            self._post_slots[tid] = slots
+            self._post_tfs[tid] = tfs
+            self._df[tid] = len(slots)
+        self._doc_ids = doc_ids
+        self._doc_lens = doc_lens
+        self._alive = bytearray(b'\x01') * len(doc_ids)
+        self._slot_of = {doc_id: slot for slot, doc_id in enumerate(doc_ids)}
+
+    def _expand(self, keyword: str) -> List[int]:
+        # Exact term plus indexed terms that start with the keyword
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._terms)
+        terms = self._sorted_terms
+        out = []
+        i = bisect_left(terms, keyword)
+        while i < len(terms) and terms[i].startswith(keyword) and len(out) < MAX_PREFIX_EXPANSIONS:
+            out.append(self._term_ids[terms[i]])
+            i += 1
+        return out
+
+    def search(self, keywords: Sequence[str], limit: int,
+               after: Optional[Tuple[float, int]] = None) -> List[Tuple[float, int]]:
+        """
+        Return up to `limit` (score, doc_id) pairs, best first, for documents matching
+        every keyword. `after` resumes below a previously returned pair.
+        """
+        if not keywords or not self._live:
+            return []
+        n_docs = self._live
+        avgdl = (self._total_len / n_docs) or 1.0
+        k1, b = self.k1, self.b
+        alive, doc_lens = self._alive, self._doc_lens
+        scores: Optional[Dict[int, float]] = None
+        for keyword in keywords:
+            term_scores: Dict[int, float] = {}
+            for tid in self._expand(keyword):
+                df = self._df[tid]
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                for slot, tf in zip(self._post_slots[tid], self._post_tfs[tid]):
+                    if scores is not None and slot not in scores:
+                        continue
+                    if not alive[slot]:
+                        continue
+                    norm = tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_lens[slot] / avgdl))
+                    term_scores[slot] = term_scores.get(slot, 0.0) + idf * norm
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {slot: score + term_scores[slot] for slot, score in scores.items() if slot in term_scores}
+            if not scores:
+                return []
+        doc_ids = self._doc_ids
+        hits: Iterable[Tuple[float, int]] = ((round(score, 6), doc_ids[slot]) for slot, score in scores.items())
+        if after is not None:
+            hits = (hit for hit in hits if hit < after)
+        return heapq.nlargest(limit, hits)
+
+
+class SearchIndex:
+    """
+    Thread-safe set of per-kind inverted indexes fed by `loader(kind, after_id)`, which
+    returns (id, title, description, artist_name) rows with id > after_id.
+    """
+
+    def __init__(self, loader: Callable[[str, int], Iterable[Tuple[int, str, str, str]]],
+                 kinds: Sequence[str] = ('posts', 'products'),
+                 refresh_interval: float = 5.0, rebuild_interval: float = 600.0,
+                 retry_interval: float = 10.0):
+        self._loader = loader
+        self._kinds = tuple(kinds)
+        self._indexes: Dict[str, InvertedIndex] = {}
+        self._lock = threading.RLock()
+        self._warming = False
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        # Seconds to wait after a failed warmup before ensure_warm tries again
+        self.retry_interval = retry_interval
+        self._last_refresh = 0.0
+        self._last_build = 0.0
+        self._retry_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._indexes)
+
+    def warm(self) -> None:
+        """
+        Build fresh indexes from the database and swap them in.
+        """
+        fresh = {}
+        for kind in self._kinds:
+            index = InvertedIndex()
+            for doc_id, title, description, artist in self._loader(kind, 0):
+                index.add(doc_id, title, description, artist)
+            fresh[kind] = index
+        with self._lock:
+            self._indexes = fresh
+            self._last_build = self._last_refresh = time.monotonic()
+
+    def start_warmup(self) -> None:
+        """
+        Warm in a background thread so startup and requests are not blocked;
+        callers fall back to the full-text index until `ready` is true.
+        """
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+
+        def run():
+            try:
+                self.warm()
+            except Exception as e:
+                self._retry_at = time.monotonic() + self.retry_interval
+                print(f"Search index warmup failed: {e}")
+            finally:
+                self._warming = False
+
+        threading.Thread(target=run, name='search-index-warmup', daemon=True).start()
+
+    def ensure_warm(self) -> None:
+        """
+        Start a warmup unless the indexes are built, one is running, or the last
+        attempt failed less than retry_interval seconds ago.
+        """
+        if not self.ready and time.monotonic() >= self._retry_at:
+            self.start_warmup()
+
+    def _maybe_refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._last_build > self.rebuild_interval:
+            # Periodic rebuild drops listings deleted by other workers
+            self._last_build = now
+            self.start_warmup()
+        if now - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            self._last_refresh = now
+            for kind, index in self._indexes.items():
+                for doc_id, title, description, artist in self._loader(kind, index.max_id):
+                    index.add(doc_id, title, description, artist)
+
+    def search(self, kind: str, keywords: Sequence[str], limit: int,
+               after: Optional[Tuple[float, int]] = None) -> List[Tuple[float, int]]:
+        if not self.ready:
+            self.ensure_warm()
+            return []
+        try:
+            self._maybe_refresh()
+        except Exception as e:
+            print(f"Search index refresh failed: {e}")
+        with self._lock:
+            return self._indexes[kind].search(keywords, limit, after)
+
+    def add(self, kind: str, doc_id: int, title: Optional[str], description: Optional[str],
+            artist: Optional[str]) -> None:
+        with self._lock:
+            index = self._indexes.get(kind)
+            if index is not None:
+                index.add(doc_id, title, description, artist)
+
+    def remove(self, kind: str, doc_id: int) -> None:
+        with self._lock:
+            index = self._indexes.get(kind)
+            if index is not None:
+                index.remove(doc_id)
@@ -0,0 +1,192 @@
+"""
+Media storage backends.
+
+`LocalStorage` keeps files under the app's static directory and is the default.
+`S3Storage` talks to any S3-compatible object store (AWS S3, MinIO, R2, ...) so
+media survives redeploys and is shared by every instance, and it can hand the
+browser presigned POSTs so uploads go straight to the bucket instead of through
+a gunicorn worker. Both address objects by a relative key such as
+"ab/cd/<sha256>.jpg".
+"""
+import mimetypes
+import os
+import shutil
+from typing import Any, BinaryIO, Dict, Optional
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except Exception:
+    boto3 = None
+    ClientError = Exception
+
+# Keys are content-addressed, so stored objects never change
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def content_type_for(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+class LocalStorage:
+    direct_uploads = False
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, *key.split('/')))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, local_path: str, key: str) -> None:
+        # Moves the file: callers hand over a temp file they no longer need
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(local_path, path)
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), 'rb')
+
+    def copy(self, src_key: str, dst_key: str) -> None:
+        path = self._path(dst_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(self._path(src_key), path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def delete_prefix(self, prefix: str) -> None:
+        directory, _, name_prefix = prefix.rpartition('/')
+        try:
+            names = os.listdir(self._path(directory)) if directory else os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(name_prefix):
+                self.delete(f"{directory}/{name}" if directory else name)
+
+    def presign_upload(self, key: str, content_type: str, max_bytes: int,
+                       expires: int = 600) -> Optional[Dict[str, Any]]:
+        return None
+
+
+class S3Storage:
+    direct_uploads = True
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 public_url: Optional[str] = None, prefix: str = ''):
+        if boto3 is None:
+            raise RuntimeError('boto3 is required for STORAGE_BACKEND=s3')
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        # Credentials come from the usual AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY chain
+        self.client = boto3.client('s3', endpoint_url=endpoint_url or None, region_name=region or None)
+        if public_url:
+            self.base_url = public_url.rstrip('/')
+        elif endpoint_url:
+            # Path-style URL, which is what MinIO serves by default
+            self.base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.base_url = f"https://{bucket}.s3.amazonaws.com"
+        if self.prefix:
+            self.base_url = f"{self.base_url}/{self.prefix}"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError:
+            return False
+
+    def put_file(self, local_path: str, key: str) -> None:
+        self.client.upload_file(local_path, self.bucket, self._key(key), ExtraArgs={
+            'ContentType': content_type_for(key),
+            'CacheControl': IMMUTABLE_CACHE_CONTROL,
+        })
+        os.remove(local_path)
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data,
+                               ContentType=content_type_for(key), CacheControl=IMMUTABLE_CACHE_CONTROL)
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    def copy(self, src_key: str, dst_key: str) -> None:
+        self.client.copy_object(
+            Bucket=self.bucket, Key=self._key(dst_key),
+            CopySource={'Bucket': self.bucket, 'Key': self._key(src_key)},
+            ContentType=content_type_for(dst_key), CacheControl=IMMUTABLE_CACHE_CONTROL,
+            MetadataDirective='REPLACE',
+        )
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def delete_prefix(self, prefix: str) -> None:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            objects = [{'Key': item['Key']} for item in page.get('Contents', [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects})
+
+    def presign_upload(self, key: str, content_type: str, max_bytes: int,
+                       expires: int = 600) -> Optional[Dict[str, Any]]:
+        """
+        Presigned POST the browser can send the file to directly. The policy pins the
+        key and content type and caps the size.
+        """
+        post = self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_bytes],
+            ],
+            ExpiresIn=expires,
+        )
+        return {'url': post['url'], 'fields': post['fields']}
+
+
+def from_env(static_root: str):
+    """
+    Storage selected by STORAGE_BACKEND ('local' or 's3'). Blob files live under
+    static/uploads/blobs locally, or under S3_PREFIX in S3_BUCKET.
+    """
+    backend = os.getenv('STORAGE_BACKEND', 'local').lower()
+    if backend == 's3':
+        return S3Storage(
+            bucket=os.environ['S3_BUCKET'],
+            endpoint_url=os.getenv('S3_ENDPOINT_URL'),
+            region=os.getenv('S3_REGION'),
+            public_url=os.getenv('S3_PUBLIC_URL'),
+            prefix=os.getenv('S3_PREFIX', 'uploads'),
+        )
+    return LocalStorage(os.path.join(static_root, 'uploads', 'blobs'), '/static/uploads/blobs')
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py picks its database when imported, so point it at a scratch SQLite file
+# before any test module imports it
+os.environ['FLASK_ENV'] = 'production'
+SCRATCH = tempfile.mkdtemp(prefix='clyst-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(SCRATCH, 'test.db')}"
+os.environ.setdefault('PROXY_FIX_HOPS', '0')
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as app_module
+    flask_app = app_module.app
+    flask_app.testing = True
+    # Hash on the calling thread; the process pool is not needed for a handful of users
+    app_module.password_hasher.workers = 0
+    # Keep uploaded test images out of static/uploads and instance/
+    app_module.media_storage.root = os.path.join(SCRATCH, 'blobs')
+    app_module.blobs.tmp_dir = os.path.join(SCRATCH, 'upload-tmp')
+    with flask_app.app_context():
+        app_module.migrate_upgrade(directory=os.path.join(ROOT, 'migrations'))
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,76 @@
+"""
+Incremental parsing of streamed copy suggestions.
+"""
+import json
+from types import SimpleNamespace
+
+import ai
+from ai import JsonObjectStream
+
+
+def _feed_all(chunks):
+    scanner = JsonObjectStream()
+    out = []
+    for chunk in chunks:
+        out.extend(scanner.feed(chunk))
+    return out
+
+
+SUGGESTIONS = {'suggestions': [
+    {'title': 'Dusk', 'description': 'Warm light'},
+    {'title': 'Tide', 'description': 'Cold water'},
+    {'title': 'Moss', 'description': 'Soft green'},
+]}
+
+
+def test_objects_split_across_chunks():
+    text = json.dumps(SUGGESTIONS)
+    # One character at a time, and in uneven pieces
+    assert _feed_all(text) == SUGGESTIONS['suggestions']
+    assert _feed_all([text[i:i + 7] for i in range(0, len(text), 7)]) == SUGGESTIONS['suggestions']
+
+
+def test_each_object_is_emitted_when_it_closes():
+    scanner = JsonObjectStream()
+    assert scanner.feed('{"suggestions": [{"title": "Dusk", "description": "x"}, {"title": "Ti') == [
+        {'title': 'Dusk', 'description': 'x'}]
+    assert scanner.feed('de", "description": "y"}]}') == [{'title': 'Tide', 'description': 'y'}]
+
+
+def test_quotes_and_braces_inside_strings():
+    item = {'title': 'The "Blue" {room}', 'description': 'Brackets ] and [ and a \\ backslash }'}
+    assert _feed_all([json.dumps({'suggestions': [item]})]) == [item]
+
+
+def test_nested_objects_stay_inside_their_suggestion():
+    items = [
+        {'title': 'Dusk', 'description': 'x', 'tags': [{'name': 'warm'}, {'name': 'light'}]},
+        {'title': 'Tide', 'description': 'y', 'meta': {'palette': ['blue']}},
+    ]
+    assert _feed_all([json.dumps({'suggestions': items})]) == items
+
+
+class _FakeModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def generate_content(self, parts, stream=False):
+        return [SimpleNamespace(text=chunk) for chunk in self.chunks]
+
+
+def _stream(monkeypatch, chunks):
+    monkeypatch.setattr(ai, 'is_configured', lambda api_key: True)
+    monkeypatch.setattr(ai, '_copy_model', lambda api_key: _FakeModel(chunks))
+    return list(ai.stream_copy_suggestions('post', image_bytes=b'not an image', api_key='key'))
+
+
+def test_stream_yields_suggestions_as_they_complete(monkeypatch):
+    text = json.dumps(SUGGESTIONS)
+    events = _stream(monkeypatch, [text[:40], text[40:90], text[90:]])
+    assert [event['suggestion']['title'] for event in events] == ['Dusk', 'Tide', 'Moss']
+
+
+def test_non_json_output_falls_back_to_text_parsing(monkeypatch):
+    events = _stream(monkeypatch, ['- Evening harbour\n', '- Quiet dunes\n'])
+    assert all(event['ok'] for event in events)
+    assert [event['suggestion']['title'] for event in events] == ['Evening harbour', 'Quiet dunes']
@@ -0,0 +1,27 @@
+"""
+Cache headers for fingerprinted assets and uploads.
+"""
+from app import static_assets
+
+
+def test_fingerprinted_assets_are_immutable(app, client):
+    with app.app_context():
+        hashed = static_assets.lookup('css/styles.css')
+    response = client.get(f'/static/{hashed}')
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    response.close()
+
+
+def test_unfingerprinted_assets_are_not_immutable(client):
+    response = client.get('/static/css/styles.css')
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+    response.close()
+
+
+def test_paths_through_uploads_are_judged_after_normalising(client):
+    response = client.get('/static/uploads/blobs/../../css/styles.css')
+    assert not response.cache_control.immutable
+    response.close()
+    assert client.get('/static/uploads/../../app.py').status_code == 404
@@ -0,0 +1,82 @@
+"""
+Reference counting in the content-addressed blob store.
+"""
+import io
+
+import pytest
+
+from app import Blob, blobs, db
+
+
+@pytest.fixture
+def store(app):
+    with app.app_context():
+        yield blobs
+        db.session.rollback()
+        db.session.execute(db.delete(Blob))
+        db.session.commit()
+
+
+def _row(url):
+    return db.session.get(Blob, blobs.digest_for(url))
+
+
+def test_identical_uploads_share_one_file(store):
+    first = store.save(io.BytesIO(b'same image'), 'png')
+    second = store.save(io.BytesIO(b'same image'), 'png')
+    db.session.commit()
+    assert first == second
+    assert _row(first).refcount == 2
+    assert db.session.scalar(db.select(db.func.count()).select_from(Blob)) == 1
+    assert store.storage.exists(store.key_for(first))
+
+
+def test_collect_keeps_referenced_blobs(store):
+    url = store.save(io.BytesIO(b'kept image'), 'png')
+    store.save(io.BytesIO(b'kept image'), 'png')
+    db.session.commit()
+    assert store.release(url)
+    db.session.commit()
+    assert store.collect() == []
+    assert _row(url).refcount == 1
+    assert store.storage.exists(store.key_for(url))
+
+
+def test_collect_removes_unreferenced_blobs_and_variants(store):
+    url = store.save(io.BytesIO(b'dropped image'), 'png')
+    db.session.commit()
+    variant = store.sibling_key(url, f'{store.digest_for(url)}_320.webp')
+    store.storage.put_bytes(variant, b'variant')
+    assert store.release(url)
+    db.session.commit()
+    assert store.collect() == [store.key_for(url)]
+    assert _row(url) is None
+    assert not store.storage.exists(store.key_for(url))
+    assert not store.storage.exists(variant)
+    # Nothing left to release
+    assert not store.release(url)
+
+
+def test_upload_re_references_a_blob_awaiting_collection(store):
+    url = store.save(io.BytesIO(b'returning image'), 'png')
+    db.session.commit()
+    store.release(url)
+    db.session.commit()
+    # The same file arrives again before collect() runs: it must survive collection
+    store.save(io.BytesIO(b'returning image'), 'png')
+    db.session.commit()
+    assert store.collect() == []
+    assert _row(url).refcount == 1
+    assert store.storage.exists(store.key_for(url))
+
+
+def test_upload_after_collection_stores_the_file_again(store):
+    url = store.save(io.BytesIO(b'collected image'), 'png')
+    db.session.commit()
+    store.release(url)
+    db.session.commit()
+    store.collect()
+    assert store.save(io.BytesIO(b'collected image'), 'png') == url
+    db.session.commit()
+    assert _row(url).refcount == 1
+    assert store.storage.exists(store.key_for(url))
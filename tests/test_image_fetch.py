@@ -0,0 +1,107 @@
+"""
+The image fetcher only ever connects to public addresses.
+"""
+import http.server
+import socket
+import threading
+
+import pytest
+
+import image_fetch
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/to-metadata':
+            self.send_response(302)
+            self.send_header('Location', 'http://169.254.169.254/latest/meta-data/')
+            self.end_headers()
+            return
+        if self.path == '/hop':
+            self.send_response(302)
+            self.send_header('Location', '/art.png')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(PNG)))
+        self.end_headers()
+        self.wfile.write(PNG)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    """
+    Resolve made-up hosts from a table, and treat the test server's loopback
+    address as public so it can stand in for a remote host.
+    """
+    table = {}
+    lookups = []
+    real_getaddrinfo = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host in table:
+            lookups.append(host)
+            answers = table[host]
+            address = answers.pop(0) if len(answers) > 1 else answers[0]
+            return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, port))]
+        return real_getaddrinfo(host, port, *args, **kwargs)
+
+    real_public_ip = image_fetch._public_ip
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    monkeypatch.setattr(image_fetch, '_public_ip', lambda address: address == '127.0.0.1' or real_public_ip(address))
+    return table, lookups
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1/art.png',
+    'http://169.254.169.254/latest/meta-data/',
+    'http://10.0.0.8/art.png',
+    'http://[::1]/art.png',
+    'http://[::ffff:127.0.0.1]/art.png',
+    'http://100.64.0.1/art.png',
+    'http://0.0.0.0/art.png',
+    'ftp://example.com/art.png',
+])
+def test_internal_and_non_http_urls_are_not_public(url):
+    assert not image_fetch.is_public_url(url)
+
+
+def test_fetches_from_a_public_host(server, dns):
+    table, lookups = dns
+    table['images.test'] = ['127.0.0.1']
+    assert image_fetch.ImageFetcher().fetch(f'http://images.test:{server}/hop') == (PNG, 'image/png')
+
+
+def test_connects_to_the_address_that_was_checked(server, dns):
+    table, lookups = dns
+    # A rebinding host: public for the first lookup, internal afterwards
+    table['rebind.test'] = ['127.0.0.1', '10.0.0.8']
+    assert image_fetch.ImageFetcher().fetch(f'http://rebind.test:{server}/art.png') == (PNG, 'image/png')
+    assert lookups == ['rebind.test']
+
+
+def test_refuses_a_host_resolving_to_an_internal_address(server, dns):
+    table, lookups = dns
+    table['internal.test'] = ['10.0.0.8']
+    assert image_fetch.ImageFetcher().fetch(f'http://internal.test:{server}/art.png') is None
+
+
+def test_refuses_redirects_to_internal_addresses(server, dns):
+    table, lookups = dns
+    table['images.test'] = ['127.0.0.1']
+    assert image_fetch.ImageFetcher().fetch(f'http://images.test:{server}/to-metadata') is None
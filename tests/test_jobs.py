@@ -0,0 +1,56 @@
+"""
+Job queue claiming and recovery of jobs whose worker died.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import Job, db, job_queue, query_counter
+
+# Not a registered task, so the app's own workers never claim these rows
+KIND = 'test_orphan'
+
+
+@pytest.fixture
+def queue(app):
+    with app.app_context():
+        yield job_queue
+        db.session.execute(db.delete(Job).where(Job.kind == KIND))
+        db.session.commit()
+
+
+def _running_job(attempts, max_attempts=3, age=3600):
+    job = Job(kind=KIND, status='running', payload='{}', attempts=attempts, max_attempts=max_attempts,
+              locked_at=datetime.utcnow() - timedelta(seconds=age), created_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_idle_polls_do_not_write(queue):
+    with query_counter.expect_queries(100) as log:
+        assert queue._claim() is None
+    assert log.statements
+    assert all(statement.lstrip().upper().startswith('SELECT') for statement in log.statements)
+
+
+def test_sweep_requeues_expired_jobs_and_fails_exhausted_ones(queue):
+    retry = _running_job(attempts=1)
+    exhausted = _running_job(attempts=3)
+    fresh = _running_job(attempts=1, age=0)
+    queue._last_sweep = 0.0
+    queue._maybe_sweep()
+    db.session.expire_all()
+    assert db.session.get(Job, retry).status == 'queued'
+    failed = db.session.get(Job, exhausted)
+    assert failed.status == 'failed' and failed.finished_at is not None
+    assert db.session.get(Job, fresh).status == 'running'
+
+
+def test_sweep_waits_for_its_interval(queue):
+    queue._last_sweep = 0.0
+    queue._maybe_sweep()
+    job_id = _running_job(attempts=1)
+    queue._maybe_sweep()
+    db.session.expire_all()
+    assert db.session.get(Job, job_id).status == 'running'
@@ -0,0 +1,93 @@
+"""
+Page renders stay within a fixed number of SQL queries however many listings
+they show, so an N+1 lazy load (e.g. post.artist per card) fails here.
+"""
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+from werkzeug.security import generate_password_hash
+
+import app as app_module
+from app import Posts, Product, User, db, query_counter
+
+ARTISTS = 5
+LISTINGS_PER_ARTIST = 4
+
+
+@pytest.fixture(scope='module')
+def listings(app):
+    with app.app_context():
+        start = datetime(2025, 1, 1)
+        for artist_id in range(1, ARTISTS + 1):
+            db.session.add(User(id=artist_id, name=f'Artist {artist_id}', email=f'artist{artist_id}@example.com',
+                                password_hash=generate_password_hash('secret'), location='Pune'))
+        db.session.flush()
+        for i in range(ARTISTS * LISTINGS_PER_ARTIST):
+            artist_id = i % ARTISTS + 1
+            created = start + timedelta(hours=i)
+            db.session.add(Posts(artist_id=artist_id, post_title=f'Painting {i}', description='Oil on canvas',
+                                 media_url='/static/uploads/example.jpg', created_at=created))
+            db.session.add(Product(artist_id=artist_id, title=f'Print {i}', description='Giclee print',
+                                   price=100 + i, img_url='/static/uploads/example.jpg', created_at=created))
+        db.session.commit()
+    yield
+    with app.app_context():
+        db.session.execute(db.delete(Posts))
+        db.session.execute(db.delete(Product))
+        db.session.execute(db.delete(app_module.Job))
+        db.session.execute(db.delete(User))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/', 2),
+    ('/products', 2),
+    ('/profile/1', 6),
+])
+def test_pages_within_query_budget(client, listings, url, budget):
+    with query_counter.expect_queries(budget):
+        response = client.get(url)
+    assert response.status_code == 200
+
+
+def test_feed_queries_do_not_grow_with_cards(client, listings):
+    with query_counter.expect_queries(100) as small:
+        client.get('/?limit=2')
+    with query_counter.expect_queries(100) as large:
+        client.get(f'/?limit={ARTISTS * LISTINGS_PER_ARTIST}')
+    assert large.count == small.count
+
+
+def _image_upload(name='work.png'):
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 48), 'teal').save(buf, 'PNG')
+    buf.seek(0)
+    return buf, name
+
+
+def test_logged_in_pages_within_query_budget(client, listings):
+    response = client.post('/login', data={'email': 'artist1@example.com', 'password': 'secret'})
+    assert response.status_code == 302
+    # Identity comes from the user cache, so logging in adds no query per page
+    with query_counter.expect_queries(2):
+        assert client.get('/').status_code == 200
+    # The first upload of an image also creates its blob row
+    with query_counter.expect_queries(9):
+        response = client.post('/add', data={'post_title': 'New work', 'description': 'Ink',
+                                             'post_image_file': _image_upload()})
+    assert response.status_code == 302
+    with query_counter.expect_queries(6):
+        response = client.post('/add_products', data={'product_name': 'New print', 'description': 'Ink', 'price': '40',
+                                                      'product_image_file': _image_upload()})
+    assert response.status_code == 302
+
+
+def test_over_budget_request_raises(app, client, listings):
+    app.config['QUERY_BUDGET'] = 1
+    try:
+        with pytest.raises(app_module.querycount.QueryBudgetExceeded):
+            client.get('/')
+    finally:
+        app.config['QUERY_BUDGET'] = query_counter.budget
@@ -0,0 +1,118 @@
+"""
+BM25 index behaviour and ranked search paging with SQL filters.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import Product, User, db, search_engine
+from search_index import InvertedIndex
+
+
+def _index(docs):
+    index = InvertedIndex()
+    for doc_id, title, description, artist in docs:
+        index.add(doc_id, title, description, artist)
+    return index
+
+
+def test_title_hits_outrank_description_hits():
+    index = _index([
+        (1, 'Quiet harbour', 'A landscape at dusk', 'Mira'),
+        (2, 'Landscape study', 'Oil on board', 'Ravi'),
+        (3, 'Portrait', 'Charcoal', 'Ravi'),
+    ])
+    assert [doc_id for _, doc_id in index.search(['landscape'], 10)] == [2, 1]
+
+
+def test_shorter_documents_rank_higher_for_equal_matches():
+    index = _index([
+        (1, 'Blue landscape with river bridge meadow and hills', '', ''),
+        (2, 'Blue landscape', '', ''),
+    ])
+    assert [doc_id for _, doc_id in index.search(['landscape'], 10)] == [2, 1]
+
+
+def test_every_keyword_must_match_and_prefixes_expand():
+    index = _index([
+        (1, 'Blue landscape', '', ''),
+        (2, 'Red landscape', '', ''),
+        (3, 'Blue portrait', '', ''),
+    ])
+    assert [doc_id for _, doc_id in index.search(['blue', 'land'], 10)] == [1]
+    assert index.search(['green'], 10) == []
+
+
+def test_after_cursor_continues_below_the_last_hit():
+    index = _index([(i, f'Landscape {i}', 'landscape ' * (i % 4), '') for i in range(1, 31)])
+    everything = index.search(['landscape'], 100)
+    assert len(everything) == 30
+    pages, after = [], None
+    while True:
+        page = index.search(['landscape'], 7, after)
+        if not page:
+            break
+        pages.extend(page)
+        after = page[-1]
+    assert pages == everything
+
+
+def test_removed_documents_are_not_returned():
+    index = _index([(1, 'Landscape', '', ''), (2, 'Landscape', '', '')])
+    index.remove(1)
+    assert len(index) == 1
+    assert [doc_id for _, doc_id in index.search(['landscape'], 10)] == [2]
+    # Re-adding replaces the old slot instead of duplicating the document
+    index.add(2, 'Portrait', '', '')
+    assert index.search(['landscape'], 10) == []
+    assert [doc_id for _, doc_id in index.search(['portrait'], 10)] == [2]
+
+
+def test_compaction_drops_tombstones_and_matches_a_fresh_index():
+    docs = [(i, f'Landscape {i}', 'oil' if i % 3 else 'ink', '') for i in range(1, 1201)]
+    index = _index(docs)
+    for doc_id in range(1, 701):
+        index.remove(doc_id)
+    # Removing past half of more than 1024 slots compacts automatically
+    assert len(index._doc_ids) < 1200
+    index.compact()
+    survivors = _index(docs[700:])
+    assert len(index._doc_ids) == len(index) == 500
+    assert index.search(['landscape', 'ink'], 50) == survivors.search(['landscape', 'ink'], 50)
+
+
+@pytest.fixture
+def priced_products(app, monkeypatch):
+    # Three cheap matches rank below seven pricier ones (equal scores order by id, newest first)
+    with app.app_context():
+        db.session.add(User(id=100, name='Seller', email='seller@example.com', password_hash='x'))
+        start = datetime(2025, 1, 1)
+        prices = [50, 60, 70] + [5000] * 7
+        for i, price in enumerate(prices):
+            db.session.add(Product(artist_id=100, title=f'Landscape print {i}', description='',
+                                   price=price, img_url='/static/uploads/example.jpg',
+                                   created_at=start + timedelta(hours=i)))
+        db.session.commit()
+        search_engine.warm()
+    monkeypatch.setattr(app_module, 'RANKED_CANDIDATES', 3)
+    yield
+    with app.app_context():
+        db.session.execute(db.delete(Product))
+        db.session.execute(db.delete(User))
+        db.session.commit()
+        search_engine.warm()
+
+
+def test_price_filter_pages_past_the_first_candidate_window(client, priced_products):
+    response = client.get('/products?q=landscape+under+100&limit=2')
+    page = response.get_data(as_text=True)
+    assert 'Landscape print 2' in page and 'Landscape print 1' in page
+    assert 'Landscape print 0' not in page and 'Landscape print 9' not in page
+    assert 'More products' in page
+
+    cursor = page.split('cursor=', 1)[1].split('"', 1)[0]
+    page = client.get(f'/products?q=landscape+under+100&limit=2&cursor={cursor}').get_data(as_text=True)
+    assert 'Landscape print 0' in page
+    assert 'Landscape print 1' not in page and 'Landscape print 9' not in page
+    assert 'More products' not in page
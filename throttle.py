@@ -0,0 +1,47 @@
+"""
+Token-bucket throttling.
+
+Each key (a client IP, an email address) gets a bucket of `burst` tokens that
+refills at `rate` tokens per second; a request that finds the bucket empty is
+refused without doing any work. Buckets live in process memory, so limits
+apply per app process.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, capacity: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        # Most recently used keys are kept; idle ones are dropped past this many
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        # key -> (tokens, monotonic time of last update)
+        self._buckets: 'OrderedDict[str, tuple]' = OrderedDict()
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.capacity:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def retry_after(self, key: str, cost: float = 1.0) -> int:
+        """
+        Whole seconds until `key` could be allowed again.
+        """
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, time.monotonic()))
+        tokens = min(self.burst, tokens + (time.monotonic() - updated) * self.rate)
+        if tokens >= cost:
+            return 0
+        return int((cost - tokens) / self.rate) + 1
@@ -0,0 +1,135 @@
+"""
+Resized variants of uploaded listing images.
+
+Feed cards render `srcset` candidates built from these variants, so browsers
+download an image close to the displayed size instead of the original upload,
+plus the intrinsic size and an inline placeholder so layout is stable and
+something shows before the image arrives.
+Variants are WebP (JPEG when Pillow lacks WebP support) and are stored next
+to the original in the blob store.
+"""
+import base64
+import io
+import json
+from typing import Any, Dict, List, Optional
+
+try:
+    from PIL import Image, ImageOps, features
+except Exception:
+    Image = None
+
+import image_fetch
+
+VARIANT_WIDTHS = (320, 640, 960, 1280)
+VARIANT_QUALITY = 80
+# Longest edge of the inline low-quality placeholder
+PLACEHOLDER_EDGE = 16
+
+
+# Formats accepted from remote URLs, matching the upload extensions
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def image_extension(data: bytes, mime_type: str = '') -> Optional[str]:
+    """
+    File extension for image bytes of a supported format, or None. Pillow decodes the
+    header when available (which also rejects decompression bombs); otherwise the
+    declared mime type is trusted.
+    """
+    if Image is None:
+        return {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif',
+                'image/webp': 'webp'}.get((mime_type or '').lower())
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+            return IMAGE_EXTENSIONS.get(img.format)
+    except Exception:
+        return None
+
+
+def _variant_format():
+    if features is not None and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def make_variants(url: str, blobs, widths=VARIANT_WIDTHS) -> Optional[Dict[str, Any]]:
+    """
+    Store resized copies of a content-addressed upload beside it. Returns
+    {'variants': [{'w': width, 'url': ...}], 'width', 'height', 'placeholder'} with
+    variants narrowest first and ending with the original, or None for URLs `blobs`
+    does not manage, when Pillow is missing or when the image cannot be read or decoded.
+    """
+    stem = blobs.digest_for(url)
+    if Image is None or stem is None:
+        return None
+    fmt, ext = _variant_format()
+    try:
+        with Image.open(io.BytesIO(blobs.read(url))) as src:
+            img = ImageOps.exif_transpose(src)
+            if img.mode not in ('RGB', 'L'):
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel('A'))
+            variants = []
+            for width in sorted(widths):
+                if width >= img.width:
+                    break
+                key = blobs.sibling_key(url, f"{stem}_{width}w.{ext}")
+                # Listings that share an upload share its variants
+                if not blobs.storage.exists(key):
+                    height = max(1, round(img.height * width / img.width))
+                    out = io.BytesIO()
+                    img.resize((width, height), Image.LANCZOS).save(out, fmt, quality=VARIANT_QUALITY)
+                    blobs.storage.put_bytes(key, out.getvalue())
+                variants.append({'w': width, 'url': blobs.storage.url(key)})
+            variants.append({'w': img.width, 'url': url})
+            return {
+                'variants': variants,
+                'width': img.width,
+                'height': img.height,
+                'placeholder': placeholder(img),
+            }
+    except Exception:
+        return None
+
+
+def placeholder(img) -> str:
+    """
+    Tiny blurred-up preview of an image as a data: URI (well under 1KB), shown as the
+    card background until the real image loads.
+    """
+    small = img.copy()
+    small.thumbnail((PLACEHOLDER_EDGE, PLACEHOLDER_EDGE), Image.BILINEAR)
+    out = io.BytesIO()
+    small.convert('RGB').save(out, 'JPEG', quality=50, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(out.getvalue()).decode('ascii')
+
+
+def variant_paths(variants_json: Optional[str]) -> List[str]:
+    """
+    Filesystem paths of the variants (not the original) of an upload stored before
+    content addressing, for cleanup; managed blobs are cleaned up by BlobStore.collect.
+    """
+    paths = []
+    for variant in _load(variants_json)[:-1]:
+        path = image_fetch.fetcher.local_path(variant.get('url', ''))
+        if path:
+            paths.append(path)
+    return paths
+
+
+def srcset(variants_json: Optional[str]) -> str:
+    """
+    Render stored variants as an HTML srcset value ('' when there are none).
+    """
+    return ', '.join(f"{v['url']} {v['w']}w" for v in _load(variants_json))
+
+
+def _load(variants_json: Optional[str]) -> List[Dict[str, Any]]:
+    if not variants_json:
+        return []
+    try:
+        return json.loads(variants_json)
+    except Exception:
+        return []
@@ -0,0 +1,175 @@
+"""
+Translation memory for listing translations.
+
+Results are keyed on a hash of the normalized source text plus the content type,
+source/target language and locale. Lookups go through an in-process LRU first and
+the `translation_memory` table second. Concurrent identical misses share a single
+in-flight Gemini call, and hit/miss counts and estimated latency saved are kept
+as metrics.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+_space_re = re.compile(r"\s+")
+
+
+def _normalize(text: Optional[str]) -> str:
+    return _space_re.sub(' ', unicodedata.normalize('NFC', text or '')).strip()
+
+
+def make_key(content_type: str = 'post', title: str = '', description: str = '',
+             target_lang: str = '', locale: str = '', source_lang: str = '') -> str:
+    """
+    Stable cache key for a translation request, using the same normalisation as ai.translate_listing.
+    """
+    parts = [
+        (content_type or '').strip().lower(),
+        (source_lang or '').strip().lower(),
+        (target_lang or '').strip().lower(),
+        (locale or '').strip().lower(),
+        _normalize(title),
+        _normalize(description),
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    # One in-flight translation that concurrent identical requests wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+
+
+class TranslationMemory:
+    def __init__(self, capacity: int = 2048):
+        self.capacity = capacity
+        self._lru: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'db_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'miss_seconds': 0.0,
+        }
+        self.db = None
+        self.model = None
+
+    def init_app(self, db, model) -> None:
+        self.db = db
+        self.model = model
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._lru[key] = result
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.capacity:
+                self._lru.popitem(last=False)
+
+    def get(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return a remembered translation for `params` (ai.translate_listing kwargs) or None.
+        Never calls the model.
+        """
+        key = make_key(**params)
+        with self._lock:
+            cached = self._lru.get(key)
+            if cached is not None:
+                self._lru.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return dict(cached)
+        row = self.db.session.get(self.model, key)
+        if row is None:
+            return None
+        try:
+            result = json.loads(row.result)
+        except Exception:
+            return None
+        row.hits = (row.hits or 0) + 1
+        row.last_used_at = datetime.utcnow()
+        self.db.session.commit()
+        with self._lock:
+            self._stats['db_hits'] += 1
+        self._remember(key, result)
+        return dict(result)
+
+    def translate(self, params: Dict[str, Any], fn: Callable[[], Dict[str, Any]],
+                  store: bool = True) -> Dict[str, Any]:
+        """
+        Return the remembered translation, or run `fn` once for all concurrent callers
+        with the same key and remember a successful result when `store` is true.
+        """
+        cached = self.get(params)
+        if cached is not None:
+            return cached
+        key = make_key(**params)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats['coalesced'] += 1
+        if not leader:
+            flight.done.wait()
+            return dict(flight.result or {'ok': False, 'error': 'Translation failed'})
+        try:
+            started = time.monotonic()
+            result = fn()
+            with self._lock:
+                self._stats['misses'] += 1
+                self._stats['miss_seconds'] += time.monotonic() - started
+            if store and result.get('ok'):
+                self._store(key, params, result)
+            flight.result = result
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _store(self, key: str, params: Dict[str, Any], result: Dict[str, Any]) -> None:
+        self._remember(key, result)
+        session = self.db.session
+        now = datetime.utcnow()
+        session.add(self.model(
+            key=key,
+            source_lang=(params.get('source_lang') or '').strip().lower(),
+            target_lang=(params.get('target_lang') or '').strip().lower(),
+            locale=(params.get('locale') or '').strip().lower(),
+            result=json.dumps(result),
+            hits=0,
+            created_at=now,
+            last_used_at=now,
+        ))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another process stored the same translation first
+            session.rollback()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Hit rate and estimated Gemini latency saved by this process.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._lru)
+        hits = stats['memory_hits'] + stats['db_hits'] + stats['coalesced']
+        lookups = hits + stats['misses']
+        avg_miss = stats['miss_seconds'] / stats['misses'] if stats['misses'] else 0.0
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['avg_miss_ms'] = round(avg_miss * 1000, 1)
+        stats['latency_saved_ms'] = round(hits * avg_miss * 1000, 1)
+        stats['miss_seconds'] = round(stats['miss_seconds'], 3)
+        return stats
@@ -0,0 +1,127 @@
+"""
+Cached identities for Flask-Login.
+
+The fields most pages read from current_user (id, name, location) come from a
+process-wide TTL cache, or failing that from a snapshot in the signed session
+cookie, so an authenticated page view usually makes no `users` query. The full
+User row is loaded only when something reads another attribute (the profile
+page reading email, for instance). Updating or deleting a User drops its cache
+entry and outdates snapshots taken before the change; both also expire on their
+own so changes made in other processes show up within the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from flask import has_request_context, session
+from flask_login import UserMixin, user_logged_in, user_logged_out
+from sqlalchemy import event
+
+SNAPSHOT_FIELDS = ('id', 'name', 'location')
+SESSION_KEY = 'user_snapshot'
+
+
+class CachedUser(UserMixin):
+    """
+    current_user built from cached fields; other attributes load the User row on first use.
+    """
+
+    def __init__(self, fields: Dict[str, Any], loader):
+        self.__dict__.update(fields)
+        self._loader = loader
+        self._user = None
+
+    def __getattr__(self, name):
+        # Only reached for attributes that are not snapshot fields
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = self._loader(self.id)
+        return getattr(self._user, name)
+
+
+class UserCache:
+    def __init__(self, ttl: float = 60.0, snapshot_ttl: float = 300.0, capacity: int = 10000):
+        self.ttl = ttl
+        self.snapshot_ttl = snapshot_ttl
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        # user id -> (fields, monotonic expiry)
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        # user id -> wall-clock time of the last change; older snapshots are ignored
+        self._changed: 'OrderedDict[int, float]' = OrderedDict()
+        self.db = None
+        self.model = None
+
+    def init_app(self, app, db, model) -> None:
+        self.db = db
+        self.model = model
+        event.listen(model, 'after_update', self._on_change)
+        event.listen(model, 'after_delete', self._on_change)
+        user_logged_in.connect(self._on_login, app)
+        user_logged_out.connect(self._on_logout, app)
+
+    def load(self, user_id) -> CachedUser:
+        """
+        Identity for Flask-Login's user_loader; 404s like db.get_or_404 when the user is gone.
+        """
+        user_id = int(user_id)
+        fields = self._cached(user_id) or self._from_session(user_id)
+        if fields is None:
+            fields = self.remember(self._load_row(user_id))
+        return CachedUser(fields, self._load_row)
+
+    def remember(self, user) -> Dict[str, Any]:
+        fields = {name: getattr(user, name) for name in SNAPSHOT_FIELDS}
+        self._store(fields)
+        if has_request_context():
+            session[SESSION_KEY] = dict(fields, at=time.time())
+        return fields
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._changed[user_id] = time.time()
+            self._changed.move_to_end(user_id)
+            while len(self._changed) > self.capacity:
+                self._changed.popitem(last=False)
+
+    def _load_row(self, user_id: int):
+        return self.db.get_or_404(self.model, user_id)
+
+    def _store(self, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[fields['id']] = (fields, time.monotonic() + self.ttl)
+            self._entries.move_to_end(fields['id'])
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def _cached(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return entry[0]
+
+    def _from_session(self, user_id: int) -> Optional[Dict[str, Any]]:
+        snapshot = session.get(SESSION_KEY) if has_request_context() else None
+        if not snapshot or snapshot.get('id') != user_id:
+            return None
+        taken = snapshot.get('at', 0)
+        with self._lock:
+            changed = self._changed.get(user_id, 0)
+        if taken < changed or time.time() - taken > self.snapshot_ttl:
+            return None
+        fields = {name: snapshot.get(name) for name in SNAPSHOT_FIELDS}
+        self._store(fields)
+        return fields
+
+    def _on_change(self, mapper, connection, target) -> None:
+        self.invalidate(target.id)
+
+    def _on_login(self, sender, user, **extra) -> None:
+        self.remember(user)
+
+    def _on_logout(self, sender, user, **extra) -> None:
+        session.pop(SESSION_KEY, None)